@@ -5,6 +5,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from werkzeug.middleware.proxy_fix import ProxyFix
 from sqlalchemy.orm import DeclarativeBase
+from dbrouting import RoutingSession, REPLICA, engine_options, reads_from_replica, stick_to_primary
+from warmup import enable_bytecode_cache
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -12,23 +14,128 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "qeBy8gL-j0D3iEeTwKITkRkImM03-_wti0kBK2UZ_Xw")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# x_for: remote_addr is the client behind the proxy, which the auth rate limits key on
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
-# Configure the database
+# Configure the database. Pool sizes are per worker process. Pre-ping costs a
+# round trip per checkout, so by default pool_recycle retires connections
+# before the server's idle timeout instead.
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+app.config['DB_POOL_SIZE'] = int(os.environ.get("DB_POOL_SIZE", 5))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get("DB_MAX_OVERFLOW", 10))  # Extra connections opened under bursts
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get("DB_POOL_TIMEOUT", 10))  # Seconds to wait for a free connection
+app.config['DB_POOL_RECYCLE'] = 300
+app.config['DB_POOL_PRE_PING'] = os.environ.get("DB_POOL_PRE_PING") == "1"
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options('primary', app.config)
+
+# Read replica (see dbrouting.py): read-only pages read from it, everything else uses the primary
+app.config['DATABASE_REPLICA_URL'] = os.environ.get("DATABASE_REPLICA_URL")
+app.config['REPLICA_ENDPOINTS'] = {'index', 'profile', 'project_detail', 'followers', 'following'}
+app.config['REPLICA_STICKY_SECONDS'] = 5  # After a write, the client reads from the primary this long
+if app.config['DATABASE_REPLICA_URL']:
+    app.config['SQLALCHEMY_BINDS'] = {
+        REPLICA: dict(engine_options(REPLICA, app.config), url=app.config['DATABASE_REPLICA_URL']),
+    }
 
 # File upload configuration
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['UPLOADS_ACCEL'] = os.environ.get("UPLOADS_ACCEL")  # None, 'x-accel' (nginx) or 'x-sendfile'
+app.config['UPLOADS_ACCEL_PREFIX'] = os.environ.get("UPLOADS_ACCEL_PREFIX", "/protected-uploads/")  # nginx internal location
+app.config['UPLOAD_DIGEST_CACHE_SIZE'] = 10000  # Blob paths whose version tag is memoized (LRU)
+app.config['VIDEO_EXTENSIONS'] = {'mp4', 'avi', 'mov'}
+app.config['VIDEO_MAX_SIZE'] = int(os.environ.get("VIDEO_MAX_SIZE", 2 * 1024 * 1024 * 1024))  # Chunked uploads bypass MAX_CONTENT_LENGTH
+app.config['VIDEO_CHUNK_SIZE'] = 8 * 1024 * 1024  # Suggested to clients; each chunk must fit MAX_CONTENT_LENGTH
+app.config['VIDEO_UPLOAD_TMP'] = os.environ.get("VIDEO_UPLOAD_TMP")  # Defaults to <instance>/partial_uploads
+app.config['VIDEO_UPLOAD_EXPIRY_HOURS'] = 24
+app.config['BLOB_GC_GRACE_HOURS'] = 48  # Unreferenced uploads are kept this long before gc-uploads deletes them
+app.config['IMAGE_WORKERS'] = int(os.environ.get("IMAGE_WORKERS", 2))  # Processes generating image variants
+
+# Response cache configuration
+app.config['RESPONSE_CACHE_ENABLED'] = True
+app.config['RESPONSE_CACHE_URL'] = os.environ.get("RESPONSE_CACHE_URL")  # Redis URL shared by all workers; in-process LRU when unset
+app.config['RESPONSE_CACHE_TIMEOUT'] = 300  # Seconds; tag invalidation normally expires entries sooner
+app.config['RESPONSE_CACHE_MAX_ENTRIES'] = 5000  # In-process LRU size
+
+# Popularity ranking configuration
+app.config['POPULARITY_HALF_LIFE_HOURS'] = 72
+app.config['POPULARITY_WINDOW_DAYS'] = 30
+app.config['POPULARITY_REFRESH_SECONDS'] = 60
+app.config['POPULARITY_REBUILD_HOURS'] = 24  # Full recompute: drops removed likes/comments, re-anchors the decay
+app.config['POPULARITY_SETTLE_SECONDS'] = 60  # Interactions are scored once this old (late commits, replica lag)
+app.config['POPULARITY_REFRESH_IN_BACKGROUND'] = True  # False: run `flask refresh-popularity` from cron instead
+
+# Home feed timelines
+app.config['TIMELINE_MAX_ENTRIES'] = 500  # Per-user cap, enforced on fan-out (and by trim_timelines())
+app.config['TIMELINE_FANOUT_LIMIT'] = 10000  # Authors above this follower count are merged at read time
+
+# In-memory follow graph (see follow_graph.py)
+app.config['FOLLOW_GRAPH_SYNC_SECONDS'] = 0.5  # How often a worker replays new follow events
+app.config['FOLLOW_GRAPH_EVENT_RETENTION_HOURS'] = 24  # trim-follow-events keeps this much history
+app.config['FOLLOW_GRAPH_REPLAY_OVERLAP'] = 1000  # Trailing event ids re-read each sync, for late commits
+app.config['FOLLOW_GRAPH_RELOAD_SECONDS'] = 3600  # Full reload from the follows table, as a backstop
+app.config['FOLLOW_GRAPH_FOF_MAX_FRIENDS'] = 500  # Followings scanned for friends-of-friends suggestions
+
+# Comment threads (see comments.py)
+app.config['COMMENTS_PER_PAGE'] = 20  # Top-level comments per page on the project page
+app.config['COMMENT_REPLY_PREVIEW'] = 3  # Replies shown under each comment before "ver mais"
+app.config['COMMENT_REPLIES_PER_PAGE'] = 20
+
+# Logged-in user loading (see identity.py)
+app.config['USER_CACHE_SECONDS'] = 30  # How long a worker reuses a user's identity columns
+app.config['USER_CACHE_MAX_ENTRIES'] = 10000
+app.config['USER_LOADER_SKIP_ENDPOINTS'] = {'static', 'uploaded_file'}  # Served without loading current_user
+
+# Password hashing and login throttling (see auth.py, ratelimit.py)
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'  # Older hashes are upgraded on the next successful login
+app.config['AUTH_WORKERS'] = int(os.environ.get("AUTH_WORKERS", 2))  # Processes hashing passwords, per web worker
+app.config['AUTH_MAX_PENDING'] = 8  # Hashes queued or running (per worker) before logins are refused with 503
+app.config['AUTH_HASH_TIMEOUT'] = 5  # Seconds a request waits for its hash
+app.config['RATE_LIMIT_URL'] = os.environ.get("RATE_LIMIT_URL")  # redis:// to share buckets between workers
+app.config['RATE_LIMITS'] = {  # name -> (burst, tokens refilled per second)
+    'auth-ip': (20, 20 / 60),
+    'auth-username': (5, 5 / 300),
+}
+
+# Like writes (see likes.py)
+app.config['LIKE_COUNTER_BUFFERED'] = os.environ.get("LIKE_COUNTER_BUFFERED") == "1"  # Batch like_count updates in memory
+app.config['LIKE_COUNTER_FLUSH_SECONDS'] = 1.0  # How often buffered counter deltas are written
+
+# Notification queue
+app.config['NOTIFICATION_QUEUE_ASYNC'] = True  # False writes notifications inside the request transaction
+app.config['NOTIFICATION_FLUSH_INTERVAL'] = 0.5  # Seconds the worker waits to collect a batch
+app.config['NOTIFICATION_BATCH_SIZE'] = 500
+app.config['NOTIFICATION_QUEUE_SIZE'] = 10000
+app.config['NOTIFICATION_RETENTION_DAYS'] = 90  # Read notifications older than this are deleted by `flask compact-notifications`
+app.config['NOTIFICATION_COMPACT_BATCH'] = 1000  # Rows deleted per transaction
+app.config['NOTIFICATION_COMPACT_PAUSE'] = 0.05  # Seconds between batches
+
+# Live unread badge (Server-Sent Events). Set a redis:// URL when running several workers.
+app.config['NOTIFICATION_BROKER_URL'] = os.environ.get("NOTIFICATION_BROKER_URL")
+app.config['NOTIFICATION_STREAM_TIMEOUT'] = 300  # Seconds before the browser reconnects; keep below gunicorn's timeout
+app.config['NOTIFICATION_STREAM_HEARTBEAT'] = 15
+app.config['NOTIFICATION_STREAM_MAX'] = int(os.environ.get("NOTIFICATION_STREAM_MAX", 16))  # Open streams per worker; keep below its threads
+
+# Request instrumentation (see instrumentation.py)
+app.config['SERVER_TIMING_ENABLED'] = True  # db/render/total timings in a Server-Timing header
+app.config['METRICS_ENABLED'] = os.environ.get("METRICS_ENABLED", "0") == "1"  # Serve /_debug/metrics
+app.config['METRICS_TOKEN'] = os.environ.get("METRICS_TOKEN")  # Required: "Authorization: Bearer <token>"; unset hides the endpoint
+app.config['METRICS_SLOW_STATEMENTS'] = 5  # Slowest statements kept per endpoint
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))  # Fraction of requests run under cProfile
+app.config['PROFILE_MIN_MS'] = 200  # Only dump profiles of requests slower than this
+app.config['PROFILE_DIR'] = os.environ.get("PROFILE_DIR", "profiles")
+app.config['QUERY_BUDGETS'] = {}  # endpoint -> max SQL statements per request
+app.config['QUERY_BUDGET_DEFAULT'] = None  # Budget for endpoints not listed above (None: unlimited)
+app.config['QUERY_BUDGET_STRICT'] = False  # Raise instead of logging; always on when app.testing
+
+# Worker warm-up (see warmup.py and gunicorn.conf.py)
+app.config['JINJA_CACHE_DIR'] = os.environ.get("JINJA_CACHE_DIR")  # Compiled templates; defaults to <instance>/jinja_cache
+app.config['WARMUP_PATHS'] = ('/', '/login')  # Requested once by each new worker before it takes traffic
 
 # Initialize the app with the extension
 db.init_app(app)
@@ -40,13 +147,18 @@ login_manager.login_view = 'login'  # type: ignore
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
+@app.before_request
+def _route_database_reads():
+    db.session.info['use_replica'] = reads_from_replica()
+
+app.after_request(stick_to_primary)
+
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
-
-with app.app_context():
-    # Make sure to import the models here or their tables won't be created
-    import models  # noqa: F401
-    db.create_all()
-    logging.info("Database tables created")
+    from identity import load_identity
+    return load_identity(int(user_id))
+
+# Workers load compiled templates from disk instead of recompiling them
+enable_bytecode_cache(app)
+
+# The schema is managed by migrations.py (`flask --app main migrate`), not at import
@@ -0,0 +1,103 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app, request
+from werkzeug.security import generate_password_hash, check_password_hash
+from models import db
+from ratelimit import hit
+
+class AuthUnavailable(Exception):
+    """Login/registration refused before any hashing; status is the HTTP status to answer with"""
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+# Password hashing is deliberately slow CPU work. It runs in a small
+# process pool so a burst of logins uses at most AUTH_WORKERS cores
+# instead of every web worker; beyond AUTH_MAX_PENDING queued hashes
+# requests are turned away immediately rather than piling up. Both are
+# per gunicorn worker: the host-wide bound is workers x AUTH_MAX_PENDING.
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = None
+
+def _get_pool():
+    # Created lazily so each forked gunicorn worker owns its pool. Children
+    # come from a forkserver, never fork()ed from this multi-threaded worker,
+    # where a lock held by another thread would stay held in the child
+    global _pool, _pending
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pending = threading.BoundedSemaphore(current_app.config['AUTH_MAX_PENDING'])
+                _pool = ProcessPoolExecutor(max_workers=current_app.config['AUTH_WORKERS'],
+                                            mp_context=multiprocessing.get_context('forkserver'))
+    return _pool
+
+def _run(function, *args):
+    pool = _get_pool()
+    if not _pending.acquire(blocking=False):
+        logging.warning('Password hashing queue full; refusing %s', request.endpoint)
+        raise AuthUnavailable('Muitas solicitações no momento. Tente novamente em instantes.', 503, 2)
+    try:
+        future = pool.submit(function, *args)
+    except BaseException:
+        _pending.release()
+        raise
+    # The slot is freed when the job really finishes (or is cancelled), not
+    # when this request stops waiting, so abandoned work still counts
+    future.add_done_callback(lambda _: _pending.release())
+    try:
+        return future.result(timeout=current_app.config['AUTH_HASH_TIMEOUT'])
+    except FutureTimeout:
+        future.cancel()  # Drops it if still queued; a running hash finishes and then frees its slot
+        raise AuthUnavailable('O servidor está ocupado. Tente novamente em instantes.', 503, 5)
+
+def _verify_and_rehash(password_hash, password, method):
+    # Runs in the pool: one round trip checks the password and, when the
+    # stored parameters are outdated, produces the replacement hash
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if password_hash.split('$', 1)[0] != method:
+        return True, generate_password_hash(password, method)
+    return True, None
+
+_dummy_hash = None
+
+def hash_password(password):
+    """Hash a new password with PASSWORD_HASH_METHOD, off the request thread"""
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(user, password):
+    """Check user's password off the request thread (user may be None).
+
+    Unknown users still pay for one hash so response times do not reveal
+    which usernames exist. On success a hash made with other parameters
+    than PASSWORD_HASH_METHOD is replaced and committed.
+    """
+    global _dummy_hash
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if user is None or not user.password_hash:
+        if _dummy_hash is None:
+            _dummy_hash = hash_password('dummy password')
+        _run(check_password_hash, _dummy_hash, password)
+        return False
+
+    valid, new_hash = _run(_verify_and_rehash, user.password_hash, password, method)
+    if new_hash:
+        user.password_hash = new_hash
+        db.session.commit()
+    return valid
+
+def limit_attempt(username):
+    """Spend a token from the per-IP and per-username buckets, or raise AuthUnavailable (429)"""
+    waits = [hit('auth-ip', request.remote_addr or 'unknown')]
+    if username:
+        waits.append(hit('auth-username', username.strip().lower()))
+    retry_after = max(waits)
+    if retry_after:
+        raise AuthUnavailable('Muitas tentativas. Aguarde um pouco e tente novamente.', 429, retry_after)
@@ -0,0 +1,363 @@
+"""Load benchmark: seed a synthetic social graph, replay a request mix, report JSON.
+
+    flask bench-seed --users 2000 --avg-follows 40
+    flask bench-run --requests 2000 --output bench_results
+    flask bench-compare bench_results/old.json bench_results/new.json
+
+Follower degrees, project counts and like/comment targets follow
+power-law (Zipf/Pareto) distributions, so a few accounts and projects
+dominate, as on the real site. Runs are reproducible for a given --seed.
+"""
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from app import app, db
+from models import User, Project, Like, Comment, Notification, follows, reconcile_counters
+from forms import CATEGORY_CHOICES
+from popularity import rebuild_scores
+from timeline import rebuild_timelines
+from search import reindex_all
+from tags import backfill_tags
+
+PASSWORD = 'benchmark'
+TAG_POOL = ['python', 'flask', 'react', 'rust', 'go', 'typescript', 'postgres', 'docker',
+            'kubernetes', 'ml', 'vue', 'django', 'android', 'ios', 'unity', 'graphql']
+WORDS = ('app api web data model fast open tool engine cloud graph stream mobile game chat '
+         'search vision robot sensor market shop music photo video map').split()
+
+# Scenario weights for bench-run; endpoint names match the Flask views
+DEFAULT_MIX = {
+    'index': 30,
+    'project_detail': 25,
+    'feed': 15,
+    'profile': 12,
+    'toggle_like': 10,
+    'notifications': 8,
+}
+
+def _pareto_count(rng, mean, alpha, cap):
+    """Heavy-tailed non-negative integer with the given mean (Pareto with shape alpha)"""
+    return min(cap, int((rng.paretovariate(alpha) - 1) * (alpha - 1) * mean))
+
+def _zipf_weights(n, exponent):
+    return [1.0 / (rank + 1) ** exponent for rank in range(n)]
+
+def _insert(model_or_table, rows, batch_size=5000):
+    table = getattr(model_or_table, '__table__', model_or_table)
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[start:start + batch_size])
+
+def seed_graph(users=1000, avg_follows=30, avg_projects=3, avg_likes=8, avg_comments=2,
+               notifications_per_user=20, alpha=2.0, zipf=1.0, seed=42, days=365):
+    """Bulk-insert a synthetic graph into an empty database; returns the row counts.
+
+    Everyone gets the password PASSWORD. Derived data (counters, tags,
+    timelines, search index, popularity) is rebuilt with the same
+    functions the CLI maintenance commands use.
+    """
+    if db.session.query(User.id).first() is not None:
+        raise RuntimeError('bench-seed needs an empty database')
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    def timestamp(after=None):
+        start = after or now - timedelta(days=days)
+        return start + (now - start) * rng.random()
+
+    password_hash = generate_password_hash(PASSWORD)  # Hashed once; it dominates otherwise
+    user_rows = [{
+        'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@bench.test',
+        'password_hash': password_hash, 'first_name': 'Bench', 'last_name': str(user_id),
+        'bio': ' '.join(rng.choices(WORDS, k=12)), 'created_at': timestamp(), 'last_seen': now,
+        'notifications_read_at': now - timedelta(days=7),
+    } for user_id in range(1, users + 1)]
+    _insert(User, user_rows)
+    user_ids = [row['id'] for row in user_rows]
+
+    # Popularity order is shuffled so celebrity accounts are not simply the oldest ones
+    popular_users = user_ids[:]
+    rng.shuffle(popular_users)
+    user_weights = _zipf_weights(users, zipf)
+
+    follow_rows = set()
+    for follower in user_ids:
+        degree = _pareto_count(rng, avg_follows, alpha, users - 1)
+        for followed in rng.choices(popular_users, weights=user_weights, k=degree):
+            if followed != follower:
+                follow_rows.add((follower, followed))
+    _insert(follows, [{'follower_id': a, 'followed_id': b} for a, b in follow_rows])
+
+    project_rows = []
+    for author in popular_users:  # Popular accounts also tend to publish more
+        for _ in range(_pareto_count(rng, avg_projects, alpha, 200)):
+            created = timestamp(user_rows[author - 1]['created_at'])
+            project_rows.append({
+                'id': len(project_rows) + 1, 'user_id': author,
+                'title': ' '.join(rng.choices(WORDS, k=3)).title(),
+                'description': ' '.join(rng.choices(WORDS, k=25)),
+                'content': ' '.join(rng.choices(WORDS, k=150)),
+                'tags': ', '.join(rng.sample(TAG_POOL, rng.randint(1, 4))),
+                'category': rng.choice(CATEGORY_CHOICES)[0],
+                'is_published': rng.random() > 0.05, 'created_at': created, 'updated_at': created,
+            })
+    _insert(Project, project_rows)
+    projects_by_popularity = [row['id'] for row in project_rows]
+    rng.shuffle(projects_by_popularity)
+    project_weights = _zipf_weights(len(project_rows), zipf)
+    project_author = {row['id']: row['user_id'] for row in project_rows}
+    project_created = {row['id']: row['created_at'] for row in project_rows}
+
+    likes, like_rows = set(), []
+    targets = rng.choices(projects_by_popularity, weights=project_weights, k=len(project_rows) * avg_likes) if project_rows else []
+    actors = rng.choices(popular_users, weights=user_weights, k=len(targets))
+    for project_id, user_id in zip(targets, actors):
+        if (user_id, project_id) not in likes:
+            likes.add((user_id, project_id))
+            like_rows.append({'user_id': user_id, 'project_id': project_id,
+                              'created_at': timestamp(project_created[project_id])})
+    _insert(Like, like_rows)
+
+    targets = rng.choices(projects_by_popularity, weights=project_weights, k=len(project_rows) * avg_comments) if project_rows else []
+    actors = rng.choices(popular_users, weights=user_weights, k=len(targets))
+    comment_rows = [{'user_id': user_id, 'project_id': project_id,
+                     'content': ' '.join(rng.choices(WORDS, k=rng.randint(3, 30))),
+                     'created_at': timestamp(project_created[project_id])}
+                    for project_id, user_id in zip(targets, actors)]
+    _insert(Comment, comment_rows)
+
+    # Notifications mirror a sample of the likes and comments; the last week's are unread
+    events = [('like', row) for row in like_rows] + [('comment', row) for row in comment_rows]
+    events = rng.sample(events, min(len(events), users * notifications_per_user))
+    notification_rows = [{
+        'user_id': project_author[row['project_id']], 'related_user_id': row['user_id'],
+        'project_id': row['project_id'], 'type': kind, 'message': f'user{row["user_id"]} {kind}',
+        'created_at': row['created_at'],
+    } for kind, row in events if project_author[row['project_id']] != row['user_id']]
+    _insert(Notification, notification_rows)
+    if db.engine.dialect.name == 'postgresql':
+        # Explicit ids were inserted, so move the serial sequences past them
+        for table in ('user', 'project'):
+            db.session.execute(db.text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT MAX(id) FROM \"{table}\"))"))
+    db.session.commit()
+
+    reconcile_counters()
+    backfill_tags()
+    reindex_all()
+    rebuild_timelines()
+    rebuild_scores()
+    db.session.commit()
+    return {'users': users, 'follows': len(follow_rows), 'projects': len(project_rows),
+            'likes': len(like_rows), 'comments': len(comment_rows), 'notifications': len(notification_rows)}
+
+class _TestClientDriver:
+    """Drives the app in-process through the Flask test client"""
+
+    def __init__(self):
+        self._clients = {}
+
+    def client(self, user_id):
+        if user_id not in self._clients:
+            client = app.test_client()
+            if user_id is not None:
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(user_id)
+                    session['_fresh'] = True
+            self._clients[user_id] = client
+        return self._clients[user_id]
+
+    def request(self, user_id, method, path):
+        response = self.client(user_id).open(path, method=method)
+        return response.status_code, response.headers.getlist('Server-Timing')
+
+class _HttpDriver:
+    """Drives a running server (e.g. gunicorn) over HTTP, logging in through the form"""
+
+    def __init__(self, base_url):
+        self._base_url = base_url.rstrip('/')
+        self._openers = {}
+
+    def _opener(self, user_id):
+        if user_id not in self._openers:
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+            if user_id is not None:
+                page = opener.open(self._base_url + '/login').read().decode()
+                token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page)
+                form = {'username': f'user{user_id}', 'password': PASSWORD}
+                if token:
+                    form['csrf_token'] = token.group(1)
+                opener.open(self._base_url + '/login', urllib.parse.urlencode(form).encode())
+            self._openers[user_id] = opener
+        return self._openers[user_id]
+
+    def request(self, user_id, method, path):
+        request = urllib.request.Request(self._base_url + path, method=method, data=b'' if method == 'POST' else None)
+        try:
+            with self._opener(user_id).open(request) as response:
+                response.read()
+                return response.status, response.headers.get_all('Server-Timing') or []
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get_all('Server-Timing') or []
+
+def _queries(server_timing):
+    for entry in server_timing:
+        match = re.search(r'desc="(\d+) queries"', entry)
+        if match:
+            return int(match.group(1))
+    return None
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def _plan(rng, count, mix, user_ids, user_weights, project_ids, project_weights, anonymous_share):
+    """Pre-draw the whole request sequence so every run replays the same traffic"""
+    endpoints = list(mix)
+    plan = []
+    for endpoint in rng.choices(endpoints, weights=[mix[name] for name in endpoints], k=count):
+        user_id = rng.choices(user_ids, weights=user_weights)[0]
+        project_id = rng.choices(project_ids, weights=project_weights)[0]
+        if endpoint in ('index', 'project_detail', 'profile') and rng.random() < anonymous_share:
+            user_id = None
+        path = {
+            'index': '/',
+            'project_detail': f'/project/{project_id}',
+            'feed': '/feed',
+            'profile': f'/profile/user{rng.choices(user_ids, weights=user_weights)[0]}',
+            'toggle_like': f'/toggle_like/{project_id}',
+            'notifications': '/notifications',
+        }[endpoint]
+        plan.append((endpoint, user_id, 'POST' if endpoint == 'toggle_like' else 'GET', path))
+    return plan
+
+def run_benchmark(requests=1000, warmup=100, concurrency=1, mix=None, anonymous_share=0.3,
+                  zipf=1.0, seed=42, base_url=None):
+    """Replay a weighted request mix and summarize latency, throughput and queries per endpoint"""
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    user_ids = [user_id for (user_id,) in db.session.execute(db.select(User.id).order_by(User.id))]
+    project_ids = [project_id for (project_id,) in db.session.execute(
+        db.select(Project.id).where(Project.is_published.is_(True)).order_by(Project.id))]
+    if not user_ids or not project_ids:
+        raise RuntimeError('Nothing to benchmark; run bench-seed first')
+    rng.shuffle(user_ids)
+    rng.shuffle(project_ids)
+    plan = _plan(rng, warmup + requests, mix, user_ids, _zipf_weights(len(user_ids), zipf),
+                 project_ids, _zipf_weights(len(project_ids), zipf), anonymous_share)
+
+    drivers = [(_HttpDriver(base_url) if base_url else _TestClientDriver()) for _ in range(concurrency)]
+    for endpoint, user_id, method, path in plan[:warmup]:
+        drivers[0].request(user_id, method, path)
+
+    samples = []
+    samples_lock = threading.Lock()
+    def worker(driver, chunk):
+        local = []
+        for endpoint, user_id, method, path in chunk:
+            started = time.perf_counter()
+            status, server_timing = driver.request(user_id, method, path)
+            local.append((endpoint, time.perf_counter() - started, status, _queries(server_timing)))
+        with samples_lock:
+            samples.extend(local)
+
+    measured = plan[warmup:]
+    threads = [threading.Thread(target=worker, args=(driver, measured[index::concurrency]))
+               for index, driver in enumerate(drivers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name in mix:
+        rows = [sample for sample in samples if sample[0] == name]
+        if not rows:
+            continue
+        latencies = sorted(sample[1] * 1000 for sample in rows)
+        queries = [sample[3] for sample in rows if sample[3] is not None]
+        endpoints[name] = {
+            'requests': len(rows),
+            'errors': sum(1 for sample in rows if sample[2] >= 500),
+            'p50_ms': round(_percentile(latencies, 0.50), 3),
+            'p90_ms': round(_percentile(latencies, 0.90), 3),
+            'p99_ms': round(_percentile(latencies, 0.99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+        }
+    all_latencies = sorted(sample[1] * 1000 for sample in samples)
+    return {
+        'meta': _metadata(seed=seed, concurrency=concurrency, warmup=warmup, mix=mix,
+                          anonymous_share=anonymous_share, target=base_url or 'test-client'),
+        'overall': {
+            'requests': len(samples),
+            'duration_s': round(elapsed, 3),
+            'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+            'p50_ms': round(_percentile(all_latencies, 0.50), 3),
+            'p99_ms': round(_percentile(all_latencies, 0.99), 3),
+        },
+        'endpoints': endpoints,
+    }
+
+def _metadata(**settings):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=app.root_path, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    counts = {model.__tablename__: db.session.query(model).count() for model in (User, Project, Like, Comment, Notification)}
+    return {
+        'commit': commit,
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'database': db.engine.dialect.name,
+        'python': platform.python_version(),
+        'rows': counts,
+        'settings': settings,
+    }
+
+def save_results(results, directory):
+    os.makedirs(directory, exist_ok=True)
+    stamp = results['meta']['timestamp'].replace(':', '').replace('-', '')
+    path = os.path.join(directory, f'{stamp}-{results["meta"]["commit"] or "nogit"}.json')
+    with open(path, 'w') as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+    return path
+
+def compare_results(old, new, threshold=0.10):
+    """Per-endpoint p50/p99/query deltas; returns (lines, regressed) where regressed is True
+    when any p99 or mean query count grew by more than threshold"""
+    lines, regressed = [], False
+    for name in sorted(set(old['endpoints']) | set(new['endpoints'])):
+        before, after = old['endpoints'].get(name), new['endpoints'].get(name)
+        if not before or not after:
+            lines.append(f'{name:<16} only in {"new" if after else "old"} run')
+            continue
+        parts = []
+        for key in ('p50_ms', 'p99_ms', 'queries_mean'):
+            if before[key] is None or after[key] is None:
+                continue
+            change = (after[key] - before[key]) / before[key] if before[key] else 0.0
+            flag = ''
+            if key in ('p99_ms', 'queries_mean') and change > threshold:
+                flag, regressed = ' !', True
+            parts.append(f'{key} {before[key]} -> {after[key]} ({change:+.0%}){flag}')
+        lines.append(f'{name:<16} ' + ', '.join(parts))
+    throughput = (old['overall']['throughput_rps'], new['overall']['throughput_rps'])
+    lines.append(f'{"throughput":<16} {throughput[0]} -> {throughput[1]} req/s')
+    return lines, regressed
@@ -0,0 +1,144 @@
+import glob
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import Blob, User, Project, VideoUpload
+from images import upload_root
+
+COPY_BUFFER = 64 * 1024
+
+# Columns whose values are blob paths; each non-null value holds one reference
+REFERENCE_COLUMNS = (User.profile_image, Project.image, Project.video)
+
+def _hash_into(source, target):
+    """Copy a stream into target while hashing it; returns (sha256 hex, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(target, 'wb') as output:
+        for buffer in iter(lambda: source.read(COPY_BUFFER), b''):
+            output.write(buffer)
+            digest.update(buffer)
+            size += len(buffer)
+    return digest.hexdigest(), size
+
+def _register(temp, folder, extension, digest, size):
+    """Keep temp as the blob for digest, or drop it if that content is already stored.
+
+    Returns (path, created). Nothing is committed; new blobs start with no
+    references and one that never gets any is removed by gc_blobs after
+    the grace period.
+    """
+    existing = db.session.get(Blob, digest)
+    if existing is not None and os.path.exists(os.path.join(upload_root(), existing.path)):
+        os.remove(temp)
+        existing.updated_at = datetime.utcnow()  # Restart the grace period
+        return existing.path, False
+
+    path = f'{folder}/{digest}{extension}'
+    os.replace(temp, os.path.join(upload_root(), path))
+    if existing is not None:
+        existing.path = path  # The file had gone missing; point at the fresh copy
+        return path, True
+    try:
+        # Savepoint: a concurrent upload of the same bytes may insert the row first
+        with db.session.begin_nested():
+            db.session.add(Blob(id=digest, path=path, size=size))
+    except IntegrityError:
+        return db.session.get(Blob, digest).path, False
+    return path, True
+
+def store_upload(file_storage, folder):
+    """Store an uploaded file under its SHA-256; returns (path, created)"""
+    extension = os.path.splitext(file_storage.filename)[1].lower()
+    os.makedirs(os.path.join(upload_root(), folder), exist_ok=True)
+    temp = os.path.join(upload_root(), folder, f'.{secrets.token_hex(8)}.tmp')
+    digest, size = _hash_into(file_storage.stream, temp)
+    return _register(temp, folder, extension, digest, size)
+
+def adopt_file(source, folder, extension, digest=None):
+    """Move an already written file (e.g. a finished chunked upload) into the store; returns its path"""
+    os.makedirs(os.path.join(upload_root(), folder), exist_ok=True)
+    if digest is None:
+        with open(source, 'rb') as stream:
+            digest = hashlib.file_digest(stream, 'sha256').hexdigest()
+    temp = os.path.join(upload_root(), folder, f'.{secrets.token_hex(8)}.tmp')
+    _move(source, temp)
+    return _register(temp, folder, extension, digest, os.path.getsize(temp))[0]
+
+def _move(source, target):
+    try:
+        os.replace(source, target)
+    except OSError:
+        # Source on another filesystem: copy next to the target, then rename
+        with open(source, 'rb') as stream:
+            _hash_into(stream, target + '.copy')
+        os.replace(target + '.copy', target)
+        os.remove(source)
+
+def _adjust_refs(path, delta):
+    # Paths stored before the blob store existed have no row and are left alone
+    if path:
+        db.session.execute(db.update(Blob).where(Blob.path == path).values(
+            ref_count=Blob.ref_count + delta, updated_at=datetime.utcnow()))
+
+def replace_reference(old_path, new_path):
+    """Move one reference from old_path to new_path (either may be None); caller commits"""
+    if old_path != new_path:
+        _adjust_refs(new_path, 1)
+        _adjust_refs(old_path, -1)
+
+def reconcile_blob_refs():
+    """Recompute every Blob.ref_count from the columns that reference blobs"""
+    counts = {}
+    for column in REFERENCE_COLUMNS:
+        rows = db.session.execute(db.select(column, db.func.count()).where(column.isnot(None)).group_by(column))
+        for path, count in rows:
+            counts[path] = counts.get(path, 0) + count
+    for blob in Blob.query:
+        blob.ref_count = counts.get(blob.path, 0)
+    db.session.commit()
+
+def import_legacy_files():
+    """Register files stored before the blob store (random names) so the GC covers them.
+
+    Referenced files keep their path; unreferenced originals are registered
+    with no references and are collected by the next gc_blobs run.
+    """
+    known = {path for (path,) in db.session.execute(db.select(Blob.path))}
+    pending = {path for (path,) in db.session.execute(db.select(VideoUpload.path).where(VideoUpload.path.isnot(None)))}
+    imported = 0
+    for folder in ('profile_pics', 'projects', 'videos'):
+        for full_path in glob.glob(os.path.join(upload_root(), folder, '*')):
+            name = os.path.basename(full_path)
+            # Originals only: variants carry an extra ".<variant>.<fmt>" suffix
+            if name.startswith('.') or name.count('.') != 1:
+                continue
+            path = f'{folder}/{name}'
+            if path in known or path in pending:
+                continue
+            with open(full_path, 'rb') as stream:
+                digest = hashlib.file_digest(stream, 'sha256').hexdigest()
+            if db.session.get(Blob, digest) is None:
+                db.session.add(Blob(id=digest, path=path, size=os.path.getsize(full_path)))
+                imported += 1
+    db.session.commit()
+    reconcile_blob_refs()
+    return imported
+
+def gc_blobs():
+    """Delete blobs (and their image variants) unreferenced for BLOB_GC_GRACE_HOURS; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config['BLOB_GC_GRACE_HOURS'])
+    pending = db.select(VideoUpload.path).where(VideoUpload.path.isnot(None))
+    orphans = Blob.query.filter(Blob.ref_count <= 0, Blob.updated_at < cutoff, Blob.path.not_in(pending)).all()
+    for blob in orphans:
+        root, _ = os.path.splitext(os.path.join(upload_root(), blob.path))
+        for path in [os.path.join(upload_root(), blob.path)] + glob.glob(glob.escape(root) + '.*.*'):
+            if os.path.exists(path):
+                os.remove(path)
+        db.session.delete(blob)
+    db.session.commit()
+    return len(orphans)
@@ -0,0 +1,91 @@
+import json
+import queue
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import current_app
+
+class LocalBroker:
+    """In-process pub/sub; only reaches subscribers in the same worker"""
+    
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+    
+    def publish(self, user_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                pass  # Slow client; it still gets the next update
+    
+    @contextmanager
+    def subscribe(self, user_id):
+        subscriber = queue.Queue(maxsize=16)
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        try:
+            yield _LocalSubscription(subscriber)
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(subscriber)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+class _LocalSubscription:
+    def __init__(self, subscriber):
+        self._subscriber = subscriber
+    
+    def get(self, timeout):
+        try:
+            return self._subscriber.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class RedisBroker:
+    """Redis pub/sub, so any gunicorn worker can push to any stream"""
+    
+    def __init__(self, url):
+        import redis  # Optional dependency, only needed for multi-worker deployments
+        self._redis = redis.Redis.from_url(url)
+    
+    @staticmethod
+    def _channel(user_id):
+        return f'nexus:notifications:{user_id}'
+    
+    def publish(self, user_id, payload):
+        self._redis.publish(self._channel(user_id), json.dumps(payload))
+    
+    @contextmanager
+    def subscribe(self, user_id):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self._channel(user_id))
+        try:
+            yield _RedisSubscription(pubsub)
+        finally:
+            pubsub.close()
+
+class _RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+    
+    def get(self, timeout):
+        message = self._pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def get_broker():
+    """The broker configured by NOTIFICATION_BROKER_URL (local when unset)"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                url = current_app.config.get('NOTIFICATION_BROKER_URL')
+                _broker = RedisBroker(url) if url else LocalBroker()
+    return _broker
@@ -0,0 +1,214 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, request, session, make_response
+from flask_login import current_user
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import User, Project, Like, Comment
+
+class LocalCache:
+    """In-process LRU with per-entry expiry; tag versions live in the same worker"""
+
+    def __init__(self, max_entries):
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def tag_versions(self, tags):
+        with self._lock:
+            return [self._tags.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+class RedisCache:
+    """Shared cache, so every gunicorn worker sees the same entries and invalidations"""
+
+    def __init__(self, url):
+        import redis  # Optional dependency, only needed for multi-worker deployments
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._redis.get(f'nexus:cache:{key}')
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, timeout):
+        self._redis.set(f'nexus:cache:{key}', pickle.dumps(value), ex=timeout)
+
+    def delete(self, key):
+        self._redis.delete(f'nexus:cache:{key}')
+
+    def tag_versions(self, tags):
+        if not tags:
+            return []
+        return [int(version or 0) for version in self._redis.mget([f'nexus:cache-tag:{tag}' for tag in tags])]
+
+    def bump_tags(self, tags):
+        pipeline = self._redis.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(f'nexus:cache-tag:{tag}')
+        pipeline.execute()
+
+_cache = None
+_cache_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0}
+
+def get_cache():
+    """The cache configured by RESPONSE_CACHE_URL (in-process LRU when unset)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                url = current_app.config.get('RESPONSE_CACHE_URL')
+                _cache = RedisCache(url) if url else LocalCache(current_app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+    return _cache
+
+# Entries are stored as (tags, tag versions, payload). Invalidating a tag
+# bumps its version, so every entry recorded under the old one goes stale
+# without having to find and delete it.
+
+def _lookup(key):
+    if not current_app.config['RESPONSE_CACHE_ENABLED']:
+        return None
+    entry = get_cache().get(key)
+    if entry is None:
+        stats['misses'] += 1
+        return None
+    tags, versions, payload = entry
+    if get_cache().tag_versions(tags) != versions:
+        stats['misses'] += 1
+        return None
+    stats['hits'] += 1
+    add_tags(*tags)
+    return payload
+
+def _store(key, tags, payload, timeout):
+    tags = sorted(set(tags))
+    get_cache().set(key, (tags, get_cache().tag_versions(tags), payload),
+                    timeout or current_app.config['RESPONSE_CACHE_TIMEOUT'])
+
+def add_tags(*tags):
+    """Record that the response being built depends on these tags"""
+    g.setdefault('cache_tags', set()).update(tags)
+
+def mark_uncacheable():
+    """Keep the current page/fragment out of the cache (e.g. it shows a placeholder)"""
+    g.cache_skip = True
+
+def invalidate(*tags):
+    if tags:
+        get_cache().bump_tags(tags)
+
+def invalidate_on_commit(session, *tags):
+    """Invalidate tags once session commits (for writes that bypass the ORM unit of work)"""
+    session.info.setdefault('cache_invalidate', set()).update(tags)
+
+def cached_page(timeout=None):
+    """Cache the whole response of a GET view for anonymous visitors.
+
+    Logged-in users, pending flash messages and responses that touch the
+    session bypass the cache. The entry is tagged with everything
+    add_tags() recorded while the view (and its fragments) ran.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or current_user.is_authenticated or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            key = f'page:{request.full_path}'
+            payload = _lookup(key)
+            if payload is not None:
+                body, status, mimetype = payload
+                response = current_app.response_class(body, status=status, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                response.vary.add('Cookie')
+                return response
+
+            g.cache_tags, g.cache_skip = set(), False
+            response = make_response(view(*args, **kwargs))
+            response.vary.add('Cookie')
+            if response.status_code == 200 and not response.direct_passthrough \
+                    and not session.modified and not g.cache_skip:
+                _store(key, g.cache_tags, (response.get_data(), response.status_code, response.mimetype), timeout)
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+def cache_fragment(name, *key_parts, tags=(), timeout=None, caller=None):
+    """Jinja helper: {% call cache_fragment('card', project.id, tags=[...]) %}...{% endcall %}
+
+    Only wrap markup that is the same for every viewer.
+    """
+    key = 'fragment:' + ':'.join([name] + [str(part) for part in key_parts])
+    html = _lookup(key)
+    if html is None:
+        outer_skip = g.get('cache_skip', False)
+        g.cache_skip = False
+        html = caller()
+        if not g.cache_skip:
+            _store(key, tags, str(html), timeout)
+        g.cache_skip = outer_skip or g.cache_skip
+        add_tags(*tags)
+    return Markup(html)
+
+# Tag scheme: project:<id> (the project, its likes and comments),
+# user:<id> (profile data and counters) and projects (listings).
+
+def _tags_for_flush(session):
+    tags = session.info.setdefault('cache_invalidate', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Project):
+            tags.update({f'project:{obj.id}', f'user:{obj.user_id}', 'projects'})
+        elif isinstance(obj, (Like, Comment)):
+            tags.add(f'project:{obj.project_id}')
+        elif isinstance(obj, User):
+            tags.add(f'user:{obj.id}')
+            # Follow/unfollow also changes the other side's follower count
+            history = inspect(obj).attrs.followed.history
+            tags.update(f'user:{user.id}' for user in list(history.added or ()) + list(history.deleted or ()))
+
+@event.listens_for(Session, 'after_flush')
+def _collect_invalidations(session, flush_context):
+    _tags_for_flush(session)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    tags = session.info.pop('cache_invalidate', None)
+    if tags:
+        invalidate(*tags)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_invalidations(session):
+    session.info.pop('cache_invalidate', None)
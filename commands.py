@@ -0,0 +1,171 @@
+import json
+import click
+from app import app
+from models import User, Project, reconcile_counters
+from popularity import refresh_scores, rebuild_scores
+from timeline import trim_timelines, rebuild_timelines
+from search import reindex_all
+from tags import backfill_tags
+from images import backfill_variants
+from resumable import purge_stale_uploads
+from blobstore import reconcile_blob_refs, import_legacy_files, gc_blobs
+from follow_graph import trim_follow_events
+from notifier import compact_notifications
+import benchmark
+from warmup import precompile_templates, warm_up, startup_report
+from migrations import MIGRATIONS, upgrade, pending_migrations, check_index_usage
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """Recompute like, comment, follower and project counters from scratch"""
+    reconcile_counters()
+    click.echo('Counters reconciled.')
+
+@app.cli.command('refresh-popularity')
+@click.option('--rebuild', is_flag=True, help='Recompute every score from the popularity window.')
+def refresh_popularity_command(rebuild):
+    """Fold new likes and comments into the popularity ranking"""
+    if not (rebuild_scores() if rebuild else refresh_scores()):
+        click.echo('Another worker is refreshing; skipped.')
+        return
+    click.echo('Popularity scores refreshed.')
+
+@app.cli.command('trim-timelines')
+def trim_timelines_command():
+    """Cap every home-feed timeline at TIMELINE_MAX_ENTRIES"""
+    click.echo(f'Removed {trim_timelines()} timeline entries.')
+
+@app.cli.command('rebuild-timelines')
+def rebuild_timelines_command():
+    """Rematerialize all home-feed timelines from the follows graph"""
+    rebuild_timelines()
+    click.echo('Timelines rebuilt.')
+
+@app.cli.command('search-reindex')
+def search_reindex_command():
+    """Rebuild the project search index"""
+    reindex_all()
+    click.echo('Search index rebuilt.')
+
+@app.cli.command('backfill-tags')
+def backfill_tags_command():
+    """Build the normalized tag index from the comma-separated Project.tags strings"""
+    backfill_tags()
+    click.echo('Tags backfilled.')
+
+@app.cli.command('build-image-variants')
+def build_image_variants_command():
+    """Generate missing card/detail/avatar variants for existing uploads"""
+    records = [(path, ('avatar',)) for (path,) in User.query.with_entities(User.profile_image).filter(
+        User.profile_image.isnot(None))]
+    records += [(path, ('card', 'detail')) for (path,) in Project.query.with_entities(Project.image).filter(
+        Project.image.isnot(None))]
+    click.echo(f'Built variants for {backfill_variants(records)} images.')
+
+@app.cli.command('purge-stale-uploads')
+def purge_stale_uploads_command():
+    """Discard chunked video uploads older than VIDEO_UPLOAD_EXPIRY_HOURS"""
+    click.echo(f'Purged {purge_stale_uploads()} stale uploads.')
+
+@app.cli.command('gc-uploads')
+@click.option('--import-legacy', is_flag=True, help='First register files uploaded before the blob store.')
+def gc_uploads_command(import_legacy):
+    """Delete uploads no profile or project has referenced for BLOB_GC_GRACE_HOURS"""
+    if import_legacy:
+        click.echo(f'Imported {import_legacy_files()} legacy files.')
+    else:
+        reconcile_blob_refs()
+    click.echo(f'Removed {gc_blobs()} unreferenced uploads.')
+
+@app.cli.command('bench-seed')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--avg-follows', default=30, show_default=True, help='Mean out-degree (Pareto distributed).')
+@click.option('--avg-projects', default=3, show_default=True)
+@click.option('--avg-likes', default=8, show_default=True, help='Likes per project on average (Zipf over projects).')
+@click.option('--avg-comments', default=2, show_default=True)
+@click.option('--notifications-per-user', default=20, show_default=True)
+@click.option('--alpha', default=2.0, show_default=True, help='Pareto shape for degrees and counts.')
+@click.option('--zipf', default=1.0, show_default=True, help='Zipf exponent for who/what gets attention.')
+@click.option('--seed', default=42, show_default=True)
+def bench_seed_command(**options):
+    """Fill an empty database with a synthetic, power-law social graph"""
+    counts = benchmark.seed_graph(**options)
+    click.echo(', '.join(f'{count} {name}' for name, count in counts.items()))
+
+@app.cli.command('bench-run')
+@click.option('--requests', 'count', default=1000, show_default=True)
+@click.option('--warmup', default=100, show_default=True)
+@click.option('--concurrency', default=1, show_default=True, help='Client threads.')
+@click.option('--anonymous-share', default=0.3, show_default=True, help='Share of page views made logged out.')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--base-url', help='Drive a running server (e.g. gunicorn) instead of the test client.')
+@click.option('--output', default='bench_results', show_default=True, help='Directory for the JSON result.')
+def bench_run_command(count, warmup, concurrency, anonymous_share, seed, base_url, output):
+    """Replay a weighted request mix and record p50/p99, throughput and queries per request"""
+    results = benchmark.run_benchmark(requests=count, warmup=warmup, concurrency=concurrency,
+                                      anonymous_share=anonymous_share, seed=seed, base_url=base_url)
+    for name, stats in results['endpoints'].items():
+        click.echo(f'{name:<16} p50 {stats["p50_ms"]:>8.2f}ms  p99 {stats["p99_ms"]:>8.2f}ms  '
+                   f'queries {stats["queries_mean"]}  errors {stats["errors"]}')
+    click.echo(f'{results["overall"]["throughput_rps"]} req/s over {results["overall"]["requests"]} requests')
+    click.echo(f'Saved {benchmark.save_results(results, output)}')
+
+@app.cli.command('bench-compare')
+@click.argument('old', type=click.File())
+@click.argument('new', type=click.File())
+@click.option('--threshold', default=0.10, show_default=True, help='Allowed p99/query growth before failing.')
+def bench_compare_command(old, new, threshold):
+    """Compare two bench-run results; exits non-zero on a regression"""
+    lines, regressed = benchmark.compare_results(json.load(old), json.load(new), threshold)
+    click.echo('\n'.join(lines))
+    if regressed:
+        raise SystemExit(1)
+
+@app.cli.command('trim-follow-events')
+def trim_follow_events_command():
+    """Drop follow events older than FOLLOW_GRAPH_EVENT_RETENTION_HOURS"""
+    click.echo(f'Removed {trim_follow_events()} follow events.')
+
+@app.cli.command('compact-notifications')
+def compact_notifications_command():
+    """Delete read notifications older than NOTIFICATION_RETENTION_DAYS, in small batches"""
+    click.echo(f'Removed {compact_notifications()} notifications.')
+
+@app.cli.command('warm-templates')
+@click.option('--report', is_flag=True, help='Also request WARMUP_PATHS and print the startup timings.')
+def warm_templates_command(report):
+    """Compile every template into the bytecode cache (run once per deploy, before starting workers)"""
+    if report:
+        warm_up(app)
+        click.echo(startup_report())
+        return
+    click.echo(f'Compiled {precompile_templates(app)} templates.')
+
+@app.cli.command('migrate')
+@click.option('--status', is_flag=True, help='List migrations and whether they are applied, without applying.')
+@click.option('--to', 'target', type=int, help='Stop after this version.')
+def migrate_command(status, target):
+    """Apply pending schema migrations (run once per deploy, before starting workers)"""
+    if status:
+        pending = {item.version for item in pending_migrations()}
+        for item in MIGRATIONS:
+            click.echo(f'{item.version:4d}  {"pending" if item.version in pending else "applied":8s}  {item.description}')
+        return
+    applied = upgrade(target)
+    for item in applied:
+        click.echo(f'Applied {item.version}: {item.description}')
+    if not applied:
+        click.echo('Schema is up to date.')
+
+@app.cli.command('check-indexes')
+@click.option('--verbose', is_flag=True, help='Print every plan, not only the failing ones.')
+def check_indexes_command(verbose):
+    """EXPLAIN the listing queries and fail if any of them does not use its index"""
+    missing = 0
+    for name, index, used, plan in check_index_usage():
+        click.echo(f'{"ok" if used else "MISSING":8s} {name}: {index}')
+        if verbose or not used:
+            click.echo('         ' + plan.replace('\n', '\n         '))
+        missing += not used
+    if missing:
+        raise click.ClickException(f'{missing} listing queries do not use their index')
@@ -0,0 +1,55 @@
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from models import Comment, db
+from pagination import paginate_keyset
+
+def comment_page(project_id, cursor=None):
+    """One keyset page of a project's top-level comments, newest first.
+
+    Authors come in through a join and each comment's first replies
+    through one extra query, so a page costs the same two statements
+    whether the project has ten comments or ten thousand.
+    """
+    query = Comment.query.options(joinedload(Comment.author)).filter(
+        Comment.project_id == project_id, Comment.parent_id.is_(None))
+    page = paginate_keyset(query, Comment.created_at, Comment.id, cursor,
+                           per_page=current_app.config['COMMENTS_PER_PAGE'])
+    load_reply_previews(page.items)
+    return page
+
+def load_reply_previews(comments):
+    """Attach the oldest COMMENT_REPLY_PREVIEW replies of each comment as comment.reply_preview"""
+    limit = current_app.config['COMMENT_REPLY_PREVIEW']
+    threads = {comment.id: comment for comment in comments if comment.reply_count}
+    for comment in comments:
+        comment.reply_preview = []
+    if not threads or not limit:
+        return comments
+
+    position = db.func.row_number().over(partition_by=Comment.parent_id, order_by=Comment.id).label('position')
+    ranked = db.select(Comment.id, position).where(Comment.parent_id.in_(threads)).subquery()
+    replies = (Comment.query.options(joinedload(Comment.author))
+               .join(ranked, ranked.c.id == Comment.id).filter(ranked.c.position <= limit)
+               .order_by(Comment.id).all())
+    for reply in replies:
+        threads[reply.parent_id].reply_preview.append(reply)
+    return comments
+
+def reply_page(parent_id, after_id=0):
+    """Replies to a comment in posting order, starting after after_id; returns (replies, has_more)"""
+    per_page = current_app.config['COMMENT_REPLIES_PER_PAGE']
+    replies = (Comment.query.options(joinedload(Comment.author))
+               .filter(Comment.parent_id == parent_id, Comment.id > after_id)
+               .order_by(Comment.id).limit(per_page + 1).all())
+    return replies[:per_page], len(replies) > per_page
+
+def thread_parent(project_id, comment_id):
+    """The top-level comment a reply to comment_id belongs under (None if it isn't on this project)"""
+    try:
+        parent = db.session.get(Comment, int(comment_id))
+    except (TypeError, ValueError):
+        return None
+    if parent is None or parent.project_id != project_id:
+        return None
+    # Replying to a reply continues the same thread instead of nesting deeper
+    return parent.parent if parent.parent_id else parent
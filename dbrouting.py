@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import defaultdict
+from flask import current_app, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+REPLICA = 'replica'  # Bind key of the read replica engine in SQLALCHEMY_BINDS
+
+class RoutingSession(Session):
+    """Session that sends plain SELECTs to the replica while info['use_replica'] is set.
+
+    Flushes, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE and anything
+    without a statement (session.connection(), get_bind()) stay on the
+    primary, so a request that turns out to write still writes correctly.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not self._flushing \
+                and getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None:
+            replica = self._db.engines.get(REPLICA)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# Checkout timing per pool (keyed by pool_logging_name). Gauges such as
+# connections in use are read straight from the pools when scraped.
+pool_stats = defaultdict(lambda: {'checkouts': 0, 'checkout_seconds': 0.0, 'max_checkout_seconds': 0.0, 'timeouts': 0})
+_pool_stats_lock = threading.Lock()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited (including opening a connection)"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with _pool_stats_lock:
+                stats = pool_stats[self.logging_name or 'default']
+                stats['checkouts'] += 1
+                stats['checkout_seconds'] += waited
+                stats['max_checkout_seconds'] = max(stats['max_checkout_seconds'], waited)
+                stats['timeouts'] += timed_out
+
+def pool_snapshot(engines):
+    """Checkout timing plus current size/in-use/overflow for each engine's pool"""
+    snapshot = {}
+    for engine in engines:
+        pool = engine.pool
+        name = pool.logging_name or 'default'
+        with _pool_stats_lock:
+            stats = dict(pool_stats[name])
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+        snapshot[name] = stats
+    return snapshot
+
+def engine_options(name, config):
+    """SQLAlchemy engine options for one pool, sized from the DB_POOL_* settings"""
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_logging_name': name,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+def reads_from_replica():
+    """Whether this request may read from the replica (before_request)"""
+    config = current_app.config
+    if not config.get('SQLALCHEMY_BINDS', {}).get(REPLICA):
+        return False
+    if request.method not in ('GET', 'HEAD') or request.endpoint not in config['REPLICA_ENDPOINTS']:
+        return False
+    # Read-your-writes: a client that just wrote reads from the primary until the replica catches up
+    return session.get('primary_until', 0) < time.time()
+
+def stick_to_primary(response):
+    """After a write request, pin the client to the primary for REPLICA_STICKY_SECONDS (after_request)"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and current_app.config.get('SQLALCHEMY_BINDS', {}).get(REPLICA):
+        session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
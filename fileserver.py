@@ -0,0 +1,91 @@
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+from werkzeug.exceptions import NotFound
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'  # Unversioned URL: cache, but check the ETag every time
+
+# Blob store files are named after their SHA-256: <folder>/<64 hex><ext>
+CONTENT_ADDRESSED = re.compile(r'^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$')
+
+# path -> digest of content-addressed files, which never change; bounded LRU
+_digests = OrderedDict()
+_digests_lock = threading.Lock()
+
+def _upload_folder():
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+def file_digest(path):
+    """Version tag (hex) of an uploaded file, used for ?v= and the ETag; None if missing.
+
+    Content-addressed blob paths already carry their SHA-256, so their tag
+    is read from the name. Other files (e.g. image variants, legacy
+    uploads) get a tag derived from their mtime and size. Nothing is read,
+    so even a 2 GB video costs at most one stat().
+    """
+    with _digests_lock:
+        digest = _digests.get(path)
+        if digest is not None:
+            _digests.move_to_end(path)
+            return digest
+
+    full_path = safe_join(_upload_folder(), path)
+    try:
+        stat = os.stat(full_path) if full_path else None
+    except FileNotFoundError:
+        return None
+    if stat is None:
+        return None
+
+    match = CONTENT_ADDRESSED.match(os.path.basename(path))
+    if match is None:
+        return hashlib.sha256(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()
+    digest = match.group(1)
+    with _digests_lock:
+        _digests[path] = digest
+        while len(_digests) > current_app.config['UPLOAD_DIGEST_CACHE_SIZE']:
+            _digests.popitem(last=False)
+    return digest
+
+def upload_url(path):
+    """Content-versioned URL for an uploaded file, safe to cache forever"""
+    digest = file_digest(path)
+    if digest is None:
+        return url_for('uploaded_file', filename=path)
+    return url_for('uploaded_file', filename=path, v=digest[:16])
+
+def send_upload(path):
+    """Serve an uploaded file with a strong ETag, Range support and cache headers.
+
+    Requests carrying the current ?v= version get an immutable response.
+    With UPLOADS_ACCEL set, only headers are produced and the front proxy
+    streams the bytes: 'x-accel' (nginx X-Accel-Redirect to
+    UPLOADS_ACCEL_PREFIX) or 'x-sendfile' (Apache/lighttpd).
+    """
+    digest = file_digest(path)
+    if digest is None:
+        raise NotFound()
+    versioned = request.args.get('v') == digest[:16]
+    mode = current_app.config['UPLOADS_ACCEL']
+
+    if mode == 'x-accel':
+        response = current_app.response_class()
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOADS_ACCEL_PREFIX'].rstrip('/') + '/' + path
+        response.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response.set_etag(digest)
+        # nginx answers conditional and Range requests itself from the internal location
+        response.make_conditional(request)
+    else:
+        # send_file handles If-None-Match / If-Range and answers Range requests with 206
+        response = send_from_directory(_upload_folder(), path, etag=digest, conditional=True,
+                                       use_x_sendfile=mode == 'x-sendfile')
+
+    response.headers['Cache-Control'] = IMMUTABLE if versioned else REVALIDATE
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,192 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from models import FollowEvent, follows, db
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+def _add(adjacency, key, value):
+    ids = adjacency.get(key)
+    if ids is None:
+        adjacency[key] = array('i', [value])
+    elif not _contains(ids, value):
+        insort(ids, value)
+
+def _remove(adjacency, key, value):
+    ids = adjacency.get(key)
+    if ids is not None:
+        index = bisect_left(ids, value)
+        if index < len(ids) and ids[index] == value:
+            del ids[index]
+
+class FollowGraph:
+    """Per-worker copy of the follows table as sorted int arrays per user.
+
+    Kept current by replaying FollowEvent rows past a watermark; a worker
+    that has been idle longer than the event retention, or has gone
+    FOLLOW_GRAPH_RELOAD_SECONDS without a reload, reloads from scratch.
+    """
+
+    def __init__(self):
+        self._following = {}
+        self._followers = {}
+        self._last_event_id = 0
+        self._seen_events = set()  # Ids applied within the replay overlap
+        self._loaded_at = None
+        self._synced_at = 0.0
+        self._popular = ([], 0.0)  # (most-followed ids, computed at)
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Rebuild both adjacency indexes from the follows table"""
+        with self._lock:
+            last_event_id = db.session.scalar(db.select(db.func.max(FollowEvent.id))) or 0
+            overlap = current_app.config['FOLLOW_GRAPH_REPLAY_OVERLAP']
+            # Events already visible are reflected by the table read below
+            seen = set(db.session.execute(db.select(FollowEvent.id).where(
+                FollowEvent.id > last_event_id - overlap, FollowEvent.id <= last_event_id)).scalars())
+            following, followers = {}, {}
+            rows = db.session.execute(db.select(follows.c.follower_id, follows.c.followed_id).order_by(
+                follows.c.follower_id, follows.c.followed_id))
+            for follower_id, followed_id in rows:
+                following.setdefault(follower_id, array('i')).append(followed_id)
+                followers.setdefault(followed_id, array('i')).append(follower_id)
+            for ids in followers.values():
+                ids[:] = array('i', sorted(ids))
+            self._following, self._followers = following, followers
+            self._last_event_id = last_event_id
+            self._seen_events = seen
+            self._loaded_at = self._synced_at = time.monotonic()
+        # Edges committed while the table was being read are replayed (idempotently) here
+        self.sync(force=True)
+
+    def _set_edge(self, follower_id, followed_id, added):
+        if added:
+            _add(self._following, follower_id, followed_id)
+            _add(self._followers, followed_id, follower_id)
+        else:
+            _remove(self._following, follower_id, followed_id)
+            _remove(self._followers, followed_id, follower_id)
+
+    def sync(self, force=False):
+        """Apply follow/unfollow events recorded since the last sync (throttled).
+
+        Event ids are assigned before commit, so an event can become
+        visible after one with a higher id. The last
+        FOLLOW_GRAPH_REPLAY_OVERLAP ids are therefore re-read on every sync;
+        an event not seen before but older than the newest applied one is
+        not replayed out of order; its edge is re-read from the follows table.
+        """
+        interval = current_app.config['FOLLOW_GRAPH_SYNC_SECONDS']
+        if not force and time.monotonic() - self._synced_at < interval:
+            return
+        retention = current_app.config['FOLLOW_GRAPH_EVENT_RETENTION_HOURS'] * 3600
+        if self._loaded_at is None or time.monotonic() - self._synced_at > retention / 2 \
+                or time.monotonic() - self._loaded_at > current_app.config['FOLLOW_GRAPH_RELOAD_SECONDS']:
+            self.load()
+            return
+
+        with self._lock:
+            overlap = current_app.config['FOLLOW_GRAPH_REPLAY_OVERLAP']
+            events = db.session.execute(db.select(FollowEvent.id, FollowEvent.follower_id,
+                                                  FollowEvent.followed_id, FollowEvent.added)
+                                        .where(FollowEvent.id > self._last_event_id - overlap)
+                                        .order_by(FollowEvent.id)).all()
+            late = set()
+            for event_id, follower_id, followed_id, added in events:
+                if event_id in self._seen_events:
+                    continue
+                self._seen_events.add(event_id)
+                if event_id < self._last_event_id:
+                    late.add((follower_id, followed_id))
+                    continue
+                self._set_edge(follower_id, followed_id, added)
+                self._last_event_id = event_id
+            if late:
+                existing = set(db.session.execute(db.select(follows.c.follower_id, follows.c.followed_id).where(
+                    db.tuple_(follows.c.follower_id, follows.c.followed_id).in_(late))).all())
+                for edge in late:
+                    self._set_edge(*edge, edge in existing)
+            low = self._last_event_id - overlap
+            self._seen_events = {event_id for event_id in self._seen_events if event_id > low}
+            self._synced_at = time.monotonic()
+
+    def is_following(self, user_id, other_id):
+        return _contains(self._following.get(user_id, ()), other_id)
+
+    def following_among(self, user_id, candidate_ids):
+        """The subset of candidate_ids that user_id follows (one page of buttons at once)"""
+        ids = self._following.get(user_id)
+        if not ids:
+            return set()
+        return {candidate for candidate in candidate_ids if _contains(ids, candidate)}
+
+    def following(self, user_id):
+        return self._following.get(user_id, array('i'))
+
+    def follower_count(self, user_id):
+        return len(self._followers.get(user_id, ()))
+
+    def suggestions(self, user_id, limit=10):
+        """Friends-of-friends ranked by how many people user_id follows also follow them.
+
+        Returns [(candidate_id, mutual_count)]; when the graph around the
+        user is too thin, the most-followed accounts fill the remainder.
+        """
+        following = self._following.get(user_id, array('i'))
+        max_friends = current_app.config['FOLLOW_GRAPH_FOF_MAX_FRIENDS']
+        # Scanning the largest followings first would be slowest and least specific
+        friends = sorted(following, key=lambda friend: len(self._following.get(friend, ())))[:max_friends]
+
+        mutual = Counter()
+        for friend in friends:
+            mutual.update(self._following.get(friend, ()))
+        candidates = [(candidate, count) for candidate, count in mutual.items()
+                      if candidate != user_id and not _contains(following, candidate)]
+        candidates.sort(key=lambda item: (-item[1], -self.follower_count(item[0]), item[0]))
+        results = candidates[:limit]
+
+        if len(results) < limit:
+            seen = {candidate for candidate, _ in results}
+            for other in self._most_followed():
+                if len(results) >= limit:
+                    break
+                if other != user_id and other not in seen and not _contains(following, other):
+                    results.append((other, 0))
+        return results
+
+    def _most_followed(self, size=200, max_age=60):
+        popular, computed_at = self._popular
+        if time.monotonic() - computed_at > max_age:
+            popular = heapq.nlargest(size, self._followers, key=lambda other: len(self._followers[other]))
+            self._popular = (popular, time.monotonic())
+        return popular
+
+_graph = None
+_graph_lock = threading.Lock()
+
+def get_graph():
+    """This worker's follow graph, loaded on first use and synced at most every FOLLOW_GRAPH_SYNC_SECONDS"""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                graph = FollowGraph()
+                graph.load()
+                _graph = graph
+    _graph.sync()
+    return _graph
+
+def trim_follow_events():
+    """Delete events older than FOLLOW_GRAPH_EVENT_RETENTION_HOURS; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config['FOLLOW_GRAPH_EVENT_RETENTION_HOURS'])
+    deleted = db.session.execute(db.delete(FollowEvent).where(FollowEvent.created_at < cutoff)).rowcount
+    db.session.commit()
+    return deleted
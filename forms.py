@@ -39,25 +39,29 @@ class EditProfileForm(FlaskForm):
     linkedin_profile = StringField('LinkedIn Profile', validators=[Optional(), URL()])
     profile_image = FileField('Profile Image', validators=[FileAllowed(['jpg', 'png', 'gif'], 'Images only!')])
 
+CATEGORY_CHOICES = [
+    ('web', 'Web Development'),
+    ('mobile', 'Mobile Development'),
+    ('desktop', 'Desktop Application'),
+    ('ai', 'AI/Machine Learning'),
+    ('data', 'Data Science'),
+    ('game', 'Game Development'),
+    ('other', 'Other')
+]
+
 class ProjectForm(FlaskForm):
     title = StringField('Project Title', validators=[DataRequired(), Length(min=3, max=200)])
     description = TextAreaField('Description', validators=[DataRequired(), Length(min=10, max=1000)])
     content = TextAreaField('Detailed Content', validators=[Optional()])
-    category = SelectField('Category', choices=[
-        ('web', 'Web Development'),
-        ('mobile', 'Mobile Development'),
-        ('desktop', 'Desktop Application'),
-        ('ai', 'AI/Machine Learning'),
-        ('data', 'Data Science'),
-        ('game', 'Game Development'),
-        ('other', 'Other')
-    ])
+    category = SelectField('Category', choices=CATEGORY_CHOICES)
     tags = StringField('Tags (comma-separated)', validators=[Optional(), Length(max=500)])
     github_link = StringField('GitHub Repository', validators=[Optional(), URL()])
     demo_link = StringField('Demo Link', validators=[Optional(), URL()])
     image = FileField('Project Image', validators=[FileAllowed(['jpg', 'png', 'gif'], 'Images only!')])
     video = FileField('Project Video', validators=[FileAllowed(['mp4', 'avi', 'mov'], 'Videos only!')])
+    video_upload = HiddenField()  # Id of a finished chunked upload (see resumable.py)
     is_published = BooleanField('Publish immediately')
 
 class CommentForm(FlaskForm):
     content = TextAreaField('Comment', validators=[DataRequired(), Length(min=1, max=1000)])
+    parent_id = HiddenField()  # Set when replying to another comment
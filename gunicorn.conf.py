@@ -0,0 +1,22 @@
+# Loaded automatically by gunicorn from the working directory
+import os
+import time
+
+# Threaded workers: a notification stream (SSE) holds a thread, not a
+# whole worker, while other threads keep serving pages. The app also caps
+# streams per worker (NOTIFICATION_STREAM_MAX) below this thread count.
+worker_class = 'gthread'
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+# Longer than NOTIFICATION_STREAM_TIMEOUT, so a stream is never killed mid-way
+timeout = 330
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+
+def post_worker_init(worker):
+    # Runs after main:app is imported and before the worker accepts
+    # connections, so the first real requests do not pay for compiling
+    # templates or opening connections after a deploy or worker recycle
+    from app import app
+    from warmup import warm_up
+    warm_up(app, import_seconds=time.perf_counter() - worker.boot_started)
@@ -0,0 +1,62 @@
+from flask import current_app, request
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from models import User, db
+from cache import LocalCache
+
+# What every page needs from current_user (navbar, badge, ownership checks).
+# Other columns stay unloaded and are fetched on first access.
+IDENTITY_COLUMNS = ('id', 'username', 'first_name', 'last_name', 'profile_image', 'unread_notification_count')
+
+_identities = None
+
+def _cache():
+    global _identities
+    if _identities is None:
+        _identities = LocalCache(current_app.config['USER_CACHE_MAX_ENTRIES'])
+    return _identities
+
+def load_identity(user_id):
+    """Flask-Login user loader backed by a short-lived per-worker cache.
+
+    Returns a User attached to the current session with only
+    IDENTITY_COLUMNS loaded, so a cache hit costs no SQL at all and the
+    object still behaves normally (relationships, edits, commits).
+    The cache is only for read-only pages: state-changing requests get
+    the row as committed now (see fresh_user).
+    """
+    if request.endpoint in current_app.config['USER_LOADER_SKIP_ENDPOINTS']:
+        return None
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return fresh_user(user_id)
+    existing = db.session.identity_map.get(identity_key(User, user_id))
+    if existing is not None:
+        return existing
+
+    values = _cache().get(user_id)
+    if values is None:
+        columns = [getattr(User, name) for name in IDENTITY_COLUMNS]
+        row = db.session.execute(db.select(*columns).where(User.id == user_id)).first()
+        if row is None:
+            return None
+        values = row._asdict()
+        _cache().set(user_id, values, current_app.config['USER_CACHE_SECONDS'])
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    db.session.add(user)
+    return user
+
+def fresh_user(user_id):
+    """Reload a user's full row, overwriting any cached copy already in the session.
+
+    The cached identity can be USER_CACHE_SECONDS old, and forget_identity
+    only clears this worker, so anything that writes based on the user's
+    columns (or shows them in a form) must start from this.
+    """
+    return db.session.get(User, user_id, populate_existing=True)
+
+def forget_identity(*user_ids):
+    """Drop cached identities after a profile or unread-count change (this worker only)"""
+    for user_id in user_ids:
+        _cache().delete(user_id)
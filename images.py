@@ -0,0 +1,106 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+from fileserver import upload_url
+from cache import mark_uncacheable
+
+# name: (max width, max height, crop to fill)
+VARIANTS = {
+    'card': (640, 480, False),
+    'detail': (1280, 960, False),
+    'avatar': (256, 256, True),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'progressive': True, 'optimize': True}),
+}
+PLACEHOLDERS = {
+    'card': 'images/project-placeholder.svg',
+    'detail': 'images/project-placeholder.svg',
+    'avatar': 'images/avatar-placeholder.png',
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    # Created lazily so each forked gunicorn worker owns its pool; started
+    # from a forkserver for the same reason as auth._get_pool
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=current_app.config['IMAGE_WORKERS'],
+                                            mp_context=multiprocessing.get_context('forkserver'))
+    return _pool
+
+def upload_root():
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+def variant_path(path, variant, fmt='webp'):
+    """Relative upload path of a generated variant, e.g. projects/ab12.card.webp"""
+    root, _ = os.path.splitext(path)
+    return f'{root}.{variant}.{fmt}'
+
+def render_variants(upload_root, path, variants):
+    """Decode an original once and write every requested variant.
+
+    Runs in the process pool. EXIF orientation is applied and then
+    dropped along with the rest of the metadata. Files are written under a
+    temporary name and renamed, so readers never see a partial image.
+    """
+    with Image.open(os.path.join(upload_root, path)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        
+        for variant in variants:
+            width, height, crop = VARIANTS[variant]
+            if crop:
+                resized = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+            
+            for fmt, (pil_format, options) in FORMATS.items():
+                output = resized.convert('RGB') if pil_format == 'JPEG' else resized
+                target = os.path.join(upload_root, variant_path(path, variant, fmt))
+                temp = target + '.tmp'
+                output.save(temp, pil_format, **options)
+                os.replace(temp, target)
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logging.error('Image variant generation failed: %s', error)
+
+def schedule_variants(path, variants):
+    """Generate variants for an uploaded original in the background"""
+    future = _get_pool().submit(render_variants, upload_root(), path, tuple(variants))
+    future.add_done_callback(_log_failure)
+    return future
+
+def variant_url(path, variant, fmt='webp'):
+    """URL of a variant, or a static placeholder until it has been generated"""
+    if not path:
+        return url_for('static', filename=PLACEHOLDERS[variant])
+    relative = variant_path(path, variant, fmt)
+    if os.path.exists(os.path.join(upload_root(), relative)):
+        return upload_url(relative)
+    mark_uncacheable()  # Don't pin the placeholder in the response cache once the variant lands
+    return url_for('static', filename=PLACEHOLDERS[variant])
+
+def backfill_variants(records):
+    """Synchronously generate missing variants for (path, variants) pairs; returns how many were built"""
+    built = 0
+    for path, variants in records:
+        missing = [variant for variant in variants
+                   if not os.path.exists(os.path.join(upload_root(), variant_path(path, variant)))]
+        if path and missing and os.path.exists(os.path.join(upload_root(), path)):
+            render_variants(upload_root(), path, missing)
+            built += 1
+    return built
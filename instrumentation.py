@@ -0,0 +1,204 @@
+import cProfile
+import heapq
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from flask import g, request, has_request_context, jsonify, abort, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app, db
+from dbrouting import REPLICA, pool_snapshot
+from warmup import startup
+import cache
+
+class QueryBudgetExceeded(Exception):
+    """An endpoint issued more SQL statements than its QUERY_BUDGETS entry allows"""
+
+class _EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.total_seconds = 0.0
+        self.slowest = []  # Min-heap of (seconds, statement), capped in _record
+
+_stats = defaultdict(_EndpointStats)
+_stats_lock = threading.Lock()
+
+# SQL timing. Listens on the Engine class so every engine (and any replica
+# added later) is covered; statements outside a request are ignored.
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or not conn.info.get('query_start'):
+        return
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    metrics = g.get('request_metrics')
+    if metrics is not None:
+        metrics['queries'] += 1
+        metrics['replica_queries'] += conn.engine.pool.logging_name == REPLICA
+        metrics['db_seconds'] += elapsed
+        metrics['statements'].append((elapsed, statement))
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time so later timings on this pooled connection pair up correctly
+    conn = context.connection
+    if context.execution_context is not None and conn is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+@before_render_template.connect_via(app)
+def _before_render(sender, template, context, **extra):
+    metrics = g.get('request_metrics')
+    if metrics is not None:
+        metrics['render_stack'].append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def _after_render(sender, template, context, **extra):
+    metrics = g.get('request_metrics')
+    if metrics is not None and metrics['render_stack']:
+        started = metrics['render_stack'].pop()
+        if not metrics['render_stack']:  # Count nested renders once
+            metrics['render_seconds'] += time.perf_counter() - started
+
+@app.before_request
+def _start_request_metrics():
+    g.request_metrics = {'start': time.perf_counter(), 'queries': 0, 'replica_queries': 0, 'db_seconds': 0.0,
+                         'render_seconds': 0.0, 'render_stack': [], 'statements': []}
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    if rate and random.random() < rate:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+def _record(endpoint, metrics, total):
+    keep = app.config['METRICS_SLOW_STATEMENTS']
+    with _stats_lock:
+        stats = _stats[endpoint]
+        stats.requests += 1
+        stats.queries += metrics['queries']
+        stats.max_queries = max(stats.max_queries, metrics['queries'])
+        stats.db_seconds += metrics['db_seconds']
+        stats.render_seconds += metrics['render_seconds']
+        stats.total_seconds += total
+        for elapsed, statement in heapq.nlargest(keep, metrics['statements'], key=lambda item: item[0]):
+            item = (elapsed, ' '.join(statement.split())[:500])
+            if len(stats.slowest) < keep:
+                heapq.heappush(stats.slowest, item)
+            elif item > stats.slowest[0]:
+                heapq.heapreplace(stats.slowest, item)
+
+def _dump_profile(profiler, endpoint, total):
+    profiler.disable()
+    if total * 1000 < app.config['PROFILE_MIN_MS']:
+        return
+    os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+    filename = f'{endpoint}-{int(time.time() * 1000)}-{total * 1000:.0f}ms.prof'
+    profiler.dump_stats(os.path.join(app.config['PROFILE_DIR'], filename))
+
+def _check_budget(endpoint, queries):
+    budget = app.config['QUERY_BUDGETS'].get(endpoint, app.config['QUERY_BUDGET_DEFAULT'])
+    if budget is None or queries <= budget:
+        return
+    message = f'{endpoint} issued {queries} SQL statements (budget {budget})'
+    if app.config['QUERY_BUDGET_STRICT'] or app.testing:
+        raise QueryBudgetExceeded(message)
+    logging.warning(message)
+
+@app.after_request
+def _finish_request_metrics(response):
+    metrics = g.pop('request_metrics', None)
+    if metrics is None:
+        return response
+    total = time.perf_counter() - metrics['start']
+    endpoint = request.endpoint or 'unknown'
+    _record(endpoint, metrics, total)
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        _dump_profile(profiler, endpoint, total)
+
+    if app.config['SERVER_TIMING_ENABLED']:
+        replica = f', {metrics["replica_queries"]} on replica' if metrics['replica_queries'] else ''
+        response.headers.add('Server-Timing', f'db;dur={metrics["db_seconds"] * 1000:.1f};desc="{metrics["queries"]} queries{replica}"')
+        response.headers.add('Server-Timing', f'render;dur={metrics["render_seconds"] * 1000:.1f}')
+        response.headers.add('Server-Timing', f'total;dur={total * 1000:.1f}')
+
+    _check_budget(endpoint, metrics['queries'])
+    return response
+
+def _prometheus():
+    lines = []
+    def metric(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            lines.append(f'{name}{labels} {value}')
+
+    with _stats_lock:
+        rows = [(f'{{endpoint="{endpoint}"}}', stats) for endpoint, stats in sorted(_stats.items())]
+        metric('nexus_requests_total', 'counter', 'Requests handled', [(labels, s.requests) for labels, s in rows])
+        metric('nexus_request_seconds_total', 'counter', 'Wall time spent in requests', [(labels, f'{s.total_seconds:.6f}') for labels, s in rows])
+        metric('nexus_db_queries_total', 'counter', 'SQL statements issued', [(labels, s.queries) for labels, s in rows])
+        metric('nexus_db_queries_max', 'gauge', 'Most SQL statements in a single request', [(labels, s.max_queries) for labels, s in rows])
+        metric('nexus_db_seconds_total', 'counter', 'Time spent executing SQL', [(labels, f'{s.db_seconds:.6f}') for labels, s in rows])
+        metric('nexus_render_seconds_total', 'counter', 'Time spent rendering templates', [(labels, f'{s.render_seconds:.6f}') for labels, s in rows])
+    metric('nexus_response_cache_hits_total', 'counter', 'Response cache hits (pages and fragments)', [('', cache.stats['hits'])])
+    metric('nexus_response_cache_misses_total', 'counter', 'Response cache misses (pages and fragments)', [('', cache.stats['misses'])])
+
+    pools = [(f'{{pool="{name}"}}', stats) for name, stats in sorted(pool_snapshot(db.engines.values()).items())]
+    metric('nexus_db_pool_checkouts_total', 'counter', 'Connections checked out of the pool', [(labels, s['checkouts']) for labels, s in pools])
+    metric('nexus_db_pool_checkout_seconds_total', 'counter', 'Time spent waiting for a pooled connection', [(labels, f"{s['checkout_seconds']:.6f}") for labels, s in pools])
+    metric('nexus_db_pool_checkout_seconds_max', 'gauge', 'Longest wait for a pooled connection', [(labels, f"{s['max_checkout_seconds']:.6f}") for labels, s in pools])
+    metric('nexus_db_pool_timeouts_total', 'counter', 'Checkouts that gave up after DB_POOL_TIMEOUT', [(labels, s['timeouts']) for labels, s in pools])
+    for key, help_text in (('size', 'Configured pool size'), ('checked_out', 'Connections in use'),
+                           ('overflow', 'Connections open beyond the pool size (negative: unopened slots)')):
+        metric(f'nexus_db_pool_{key}', 'gauge', help_text, [(labels, s[key]) for labels, s in pools if key in s])
+
+    boot = [(f'{{stage="{stage}"}}', f'{startup[f"{stage}_seconds"]:.6f}') for stage in ('import', 'templates', 'ready')
+            if startup[f'{stage}_seconds'] is not None]
+    metric('nexus_startup_seconds', 'gauge', 'Time this worker spent booting, by stage', boot)
+    metric('nexus_startup_first_request_seconds', 'gauge', 'Warm-up request time per path',
+           [(f'{{path="{path}"}}', f'{seconds:.6f}') for path, seconds in sorted(startup['first_requests'].items())])
+    return '\n'.join(lines) + '\n'
+
+@app.route('/_debug/metrics')
+def debug_metrics():
+    """Per-endpoint request metrics, Prometheus text format (?format=json adds slowest statements)"""
+    token = app.config['METRICS_TOKEN']
+    # Statements, pool state and timings are not public: no token, no endpoint
+    if not app.config['METRICS_ENABLED'] or not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(403)
+
+    if request.args.get('format') == 'json':
+        with _stats_lock:
+            endpoints = {endpoint: {
+                'requests': stats.requests,
+                'queries': stats.queries,
+                'max_queries': stats.max_queries,
+                'db_seconds': round(stats.db_seconds, 6),
+                'render_seconds': round(stats.render_seconds, 6),
+                'total_seconds': round(stats.total_seconds, 6),
+                'slowest_statements': [{'seconds': round(elapsed, 6), 'statement': statement}
+                                       for elapsed, statement in sorted(stats.slowest, reverse=True)],
+            } for endpoint, stats in _stats.items()}
+        return jsonify(dict(endpoints, _pools=pool_snapshot(db.engines.values()), _startup=startup))
+    return app.response_class(_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def reset_metrics():
+    """Forget everything collected so far (handy between benchmark or test runs)"""
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,159 @@
+import atexit
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam, event, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Project, Like, db
+from cache import invalidate, invalidate_on_commit
+
+# changed is False when the like was already in the requested state (a
+# repeated or racing click), so callers only notify on real transitions.
+LikeResult = namedtuple('LikeResult', 'changed liked like_count project')
+
+def _dialect():
+    return db.session.get_bind().dialect
+
+def _insert_like(user_id, project_id):
+    """Insert the like unless it exists (or the project doesn't); True if a row was added"""
+    source = db.select(literal(user_id), Project.id, literal(datetime.utcnow())).where(Project.id == project_id)
+    columns = [Like.user_id, Like.project_id, Like.created_at]
+    dialect = _dialect()
+    if dialect.name in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect.name == 'postgresql' else sqlite.insert
+        statement = insert(Like).from_select(columns, source).on_conflict_do_nothing().returning(Like.id)
+        return db.session.execute(statement).first() is not None
+    # Other databases: let the unique constraint decide inside a savepoint
+    try:
+        with db.session.begin_nested():
+            return db.session.execute(db.insert(Like).from_select(columns, source)).rowcount > 0
+    except IntegrityError:
+        return False
+
+def _delete_like(user_id, project_id):
+    """Delete the like if present; True if a row was removed"""
+    statement = db.delete(Like).where(Like.user_id == user_id, Like.project_id == project_id)
+    if _dialect().delete_returning:
+        return db.session.execute(statement.returning(Like.id)).first() is not None
+    return db.session.execute(statement).rowcount > 0
+
+def _updated_project(project_id, delta):
+    """Apply delta to like_count and load the project in the same round trip"""
+    if not delta:
+        return db.session.get(Project, project_id, populate_existing=True)
+    statement = (db.update(Project).where(Project.id == project_id)
+                 .values(like_count=Project.like_count + delta)
+                 .execution_options(synchronize_session=False))
+    if _dialect().update_returning:
+        return db.session.scalars(statement.returning(Project), execution_options={'populate_existing': True}).first()
+    db.session.execute(statement)
+    return db.session.get(Project, project_id, populate_existing=True)
+
+def _apply(user_id, project_id, liked, changed):
+    buffered = current_app.config['LIKE_COUNTER_BUFFERED']
+    delta = (1 if liked else -1) if changed else 0
+    project = _updated_project(project_id, 0 if buffered else delta)
+    if project is None:
+        return None
+    like_count = project.like_count
+    if changed:
+        if buffered:
+            db.session.info.setdefault('like_deltas', {})
+            db.session.info['like_deltas'][project_id] = db.session.info['like_deltas'].get(project_id, 0) + delta
+        invalidate_on_commit(db.session, f'project:{project_id}')
+    if buffered:
+        like_count += counter_buffer.pending(project_id) + db.session.info.get('like_deltas', {}).get(project_id, 0)
+    return LikeResult(changed, liked, max(like_count, 0), project)
+
+def set_like(user, project_id):
+    """Make user like the project; safe to repeat. None if the project does not exist.
+
+    Does not commit. Two statements: INSERT ... ON CONFLICT DO NOTHING
+    RETURNING, then UPDATE ... RETURNING the project with its new counter
+    (a plain SELECT when the counter is buffered or nothing changed).
+    """
+    return _apply(user.id, project_id, True, _insert_like(user.id, project_id))
+
+def unset_like(user, project_id):
+    """Remove user's like from the project; safe to repeat. None if the project does not exist"""
+    return _apply(user.id, project_id, False, _delete_like(user.id, project_id))
+
+class CounterBuffer:
+    """Collects like_count deltas per project and writes them every LIKE_COUNTER_FLUSH_SECONDS.
+
+    A trending project then takes one counter UPDATE per interval instead
+    of one per click, so clicks stop queueing on its row lock. Deltas are
+    only added once the request that produced them has committed; any
+    lost to a crash are repaired by reconcile-counters.
+    """
+
+    def __init__(self):
+        self._deltas = {}
+        self._thread = None
+        self._app = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # Started lazily so each forked gunicorn worker gets its own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._app = current_app._get_current_object()
+            self._thread = threading.Thread(target=self._run, name='like-counter-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def add(self, deltas):
+        self._ensure_worker()
+        with self._lock:
+            for project_id, delta in deltas.items():
+                self._deltas[project_id] = self._deltas.get(project_id, 0) + delta
+
+    def pending(self, project_id):
+        return self._deltas.get(project_id, 0)
+
+    def flush(self):
+        """Write every pending delta in one transaction; returns how many projects were updated"""
+        with self._lock:
+            deltas, self._deltas = {k: v for k, v in self._deltas.items() if v}, {}
+        if not deltas:
+            return 0
+        table = Project.__table__
+        statement = (table.update().where(table.c.id == bindparam('project_id'))
+                     .values(like_count=table.c.like_count + bindparam('delta')))
+        with self._app.app_context():
+            try:
+                db.session.execute(statement, [{'project_id': project_id, 'delta': delta}
+                                               for project_id, delta in sorted(deltas.items())])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logging.exception('Failed to write like counters for %d projects', len(deltas))
+                self.add(deltas)  # Retry on the next tick
+                return 0
+            invalidate(*(f'project:{project_id}' for project_id in deltas))
+        return len(deltas)
+
+    def _run(self):
+        while True:
+            time.sleep(self._app.config['LIKE_COUNTER_FLUSH_SECONDS'])
+            self.flush()
+
+counter_buffer = CounterBuffer()
+
+@event.listens_for(Session, 'after_commit')
+def _buffer_like_deltas(session):
+    deltas = session.info.pop('like_deltas', None)
+    if deltas:
+        counter_buffer.add(deltas)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_like_deltas(session):
+    session.info.pop('like_deltas', None)
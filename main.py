@@ -1,5 +1,11 @@
 from app import app
 import routes  # noqa: F401
+import commands  # noqa: F401
+import instrumentation  # noqa: F401
 
 if __name__ == "__main__":
+    # The dev server is a single process, so it can bring its own database up to date
+    from migrations import upgrade
+    with app.app_context():
+        upgrade()
     app.run(host="0.0.0.0", port=5000, debug=True)
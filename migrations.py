@@ -0,0 +1,285 @@
+"""Versioned schema migrations, applied with `flask migrate`.
+
+Workers never touch the schema; deploys run the pending migrations
+once before starting them. Every step is written to be safe to re-run
+(checkfirst / IF NOT EXISTS), so a migration that died half way can
+simply be applied again. New schema changes get a new, higher version
+number; applied versions are never edited.
+"""
+import logging
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import inspect, table, column, Boolean
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from models import (User, Project, Like, Comment, Notification, NotificationActor, TimelineEntry, PopularityState,
+                    SearchTerm, follows, reconcile_counters, db)
+from tags import backfill_tags
+from timeline import rebuild_timelines
+from search import reindex_all
+
+schema_migration = db.Table('schema_migration',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(255), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False),
+)
+
+Migration = namedtuple('Migration', 'version description apply transactional')
+MIGRATIONS = []
+
+# Arbitrary key for pg_advisory_lock, so two deploys cannot migrate at once
+LOCK_KEY = 7262011
+
+def migration(version, description, transactional=True):
+    """Register a migration. Non-transactional ones run in autocommit (CREATE INDEX CONCURRENTLY)."""
+    def register(apply):
+        MIGRATIONS.append(Migration(version, description, apply, transactional))
+        MIGRATIONS.sort(key=lambda item: item.version)
+        return apply
+    return register
+
+@migration(1, 'Create tables')
+def _create_tables(conn):
+    # Matches what app.py used to do at import: only creates tables that are missing
+    db.metadata.create_all(conn)
+
+@migration(2, 'Add columns missing from databases created before migrations')
+def _add_missing_columns(conn):
+    inspector = inspect(conn)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                logging.warning('Cannot add NOT NULL column %s.%s without a server default; add it by hand',
+                                table.name, column.name)
+                continue
+            # Constraints (FKs included) stay table-level; only the column itself is added
+            definition = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f'ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} '
+                                 f'ADD COLUMN {definition}')
+
+# Indexes behind the listing pages; check_index_usage() verifies the plans
+HOT_PATH_INDEXES = ('ix_project_published_created', 'ix_project_user_published_created',
+                    'ix_notification_user_created', 'ix_notification_user_unread',
+                    'ix_comment_project_parent_created', 'ix_like_project', 'ix_follows_followed_follower',
+                    'ix_timeline_entry_user_created_project')
+# Replaced by a wider index above
+OBSOLETE_INDEXES = ('ix_timeline_entry_user_created',)
+
+# Indexes a later migration dropped together with their column, defined
+# here so earlier migrations keep building exactly what they shipped
+_retired = db.MetaData()
+_notification_v3 = db.Table('notification', _retired, db.Column('user_id', db.Integer), db.Column('read', db.Boolean))
+RETIRED_INDEXES = {index.name: index for index in (
+    db.Index('ix_notification_user_unread', _notification_v3.c.user_id,  # dropped by migration 4
+             postgresql_where=_notification_v3.c.read == False, sqlite_where=_notification_v3.c.read == False),
+)}
+
+def _find_index(name):
+    for table in db.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    return RETIRED_INDEXES[name]
+
+def create_index(conn, index):
+    """CREATE INDEX IF NOT EXISTS, concurrently on PostgreSQL so writes keep flowing"""
+    if index.name in RETIRED_INDEXES:
+        existing = {column['name'] for column in inspect(conn).get_columns(index.table.name)}
+        if not {column.name for column in index.table.columns} <= existing:
+            return  # The database was created after the column was dropped
+    if conn.dialect.name == 'postgresql':
+        # A failed CONCURRENTLY build leaves an invalid index behind that IF NOT EXISTS would keep
+        invalid = conn.exec_driver_sql(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = %(name)s AND NOT i.indisvalid", {'name': index.name}).first()
+        if invalid:
+            conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}')
+        index.dialect_kwargs['postgresql_concurrently'] = True
+        try:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+        finally:
+            index.dialect_kwargs['postgresql_concurrently'] = False
+    else:
+        conn.execute(CreateIndex(index, if_not_exists=True))
+
+@migration(3, 'Composite and partial indexes for listing pages', transactional=False)
+def _hot_path_indexes(conn):
+    for name in HOT_PATH_INDEXES:
+        create_index(conn, _find_index(name))
+    concurrently = ' CONCURRENTLY' if conn.dialect.name == 'postgresql' else ''
+    for name in OBSOLETE_INDEXES:
+        conn.exec_driver_sql(f'DROP INDEX{concurrently} IF EXISTS {name}')
+    # Fresh statistics so the planner actually picks the new indexes
+    conn.exec_driver_sql('ANALYZE')
+
+@migration(4, 'Replace Notification.read with a per-user read watermark')
+def _notification_read_watermark(conn):
+    _add_missing_columns(conn)  # user.notifications_read_at
+    if 'read' not in {column['name'] for column in inspect(conn).get_columns(Notification.__tablename__)}:
+        return
+    # Everything up to the newest notification the user had read counts as read
+    legacy = table(Notification.__tablename__, column('user_id'), column('created_at'), column('read', Boolean))
+    conn.execute(db.update(User).where(User.notifications_read_at.is_(None)).values(
+        notifications_read_at=db.select(db.func.max(legacy.c.created_at)).where(
+            legacy.c.user_id == User.id, legacy.c.read == True).scalar_subquery()))
+    conn.execute(db.update(User).values(
+        unread_notification_count=db.select(db.func.count()).select_from(Notification).where(
+            Notification.user_id == User.id, db.or_(User.notifications_read_at.is_(None),
+                                                    Notification.created_at > User.notifications_read_at)
+        ).scalar_subquery()))
+    conn.exec_driver_sql('DROP INDEX IF EXISTS ix_notification_user_unread')
+    preparer = conn.dialect.identifier_preparer
+    conn.exec_driver_sql(f'ALTER TABLE {preparer.format_table(Notification.__table__)} '
+                         f'DROP COLUMN {preparer.quote("read")}')
+
+@migration(5, 'Record every actor of coalesced like notifications')
+def _notification_actors(conn):
+    NotificationActor.__table__.create(conn, checkfirst=True)
+    # Older coalesced rows only remember their latest actor
+    conn.execute(db.insert(NotificationActor).from_select(
+        ['notification_id', 'user_id'],
+        db.select(Notification.id, Notification.related_user_id).where(
+            Notification.type == 'like', Notification.related_user_id.isnot(None),
+            ~db.exists().where(NotificationActor.notification_id == Notification.id))))
+
+@migration(6, 'Time-based popularity watermark', transactional=False)
+def _popularity_time_watermark(conn):
+    for name in ('ix_like_created', 'ix_comment_created'):
+        create_index(conn, _find_index(name))
+    _add_missing_columns(conn)  # popularity_state.watermark; left NULL so the next refresh rebuilds
+    columns = {column['name'] for column in inspect(conn).get_columns(PopularityState.__tablename__)}
+    table_name = conn.dialect.identifier_preparer.format_table(PopularityState.__table__)
+    for name in ('last_like_id', 'last_comment_id'):
+        if name in columns:
+            conn.exec_driver_sql(f'ALTER TABLE {table_name} DROP COLUMN {name}')
+
+# Data migrations reuse the batched maintenance functions, which commit
+# through db.session as they go; each is safe to re-run from the start.
+
+@migration(7, 'Backfill normalized tags from Project.tags', transactional=False)
+def _backfill_tags(conn):
+    backfill_tags()
+
+@migration(8, 'Backfill denormalized counters', transactional=False)
+def _backfill_counters(conn):
+    reconcile_counters()  # Migration 2 added the counter columns as 0 on existing rows
+
+@migration(9, 'Materialize home-feed timelines', transactional=False)
+def _backfill_timelines(conn):
+    rebuild_timelines()
+
+@migration(10, 'Build the project search index', transactional=False)
+def _backfill_search_index(conn):
+    SearchTerm.__table__.create(conn, checkfirst=True)
+    reindex_all()
+
+@migration(11, 'Full-text search index on PostgreSQL', transactional=False)
+def _search_gin_index(conn):
+    if conn.dialect.name == 'postgresql':
+        create_index(conn, _find_index('ix_project_search'))
+
+def applied_versions(conn):
+    if not inspect(conn).has_table(schema_migration.name):
+        return set()
+    return set(conn.execute(db.select(schema_migration.c.version)).scalars())
+
+def pending_migrations():
+    with db.engine.connect() as conn:
+        applied = applied_versions(conn)
+    return [item for item in MIGRATIONS if item.version not in applied]
+
+def _apply(item):
+    if item.transactional:
+        with db.engine.begin() as conn:
+            item.apply(conn)
+            conn.execute(schema_migration.insert().values(
+                version=item.version, description=item.description, applied_at=datetime.utcnow()))
+        return
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        item.apply(conn)
+        conn.execute(schema_migration.insert().values(
+            version=item.version, description=item.description, applied_at=datetime.utcnow()))
+
+def upgrade(target=None):
+    """Apply pending migrations in order, up to target; returns the ones applied"""
+    with db.engine.begin() as conn:
+        schema_migration.create(conn, checkfirst=True)
+
+    lock = None
+    if db.engine.dialect.name == 'postgresql':
+        lock = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        lock.exec_driver_sql(f'SELECT pg_advisory_lock({LOCK_KEY})')
+    try:
+        applied = []
+        for item in pending_migrations():  # Re-read under the lock
+            if target is not None and item.version > target:
+                break
+            logging.info('Applying migration %d: %s', item.version, item.description)
+            _apply(item)
+            applied.append(item)
+        return applied
+    finally:
+        if lock is not None:
+            lock.exec_driver_sql(f'SELECT pg_advisory_unlock({LOCK_KEY})')
+            lock.close()
+
+# The listing queries behind index, feed, profile, notifications,
+# project_detail and followers, each with the index it should use.
+
+def _hot_queries():
+    user_id = project_id = 1
+    newest_projects = (Project.created_at.desc(), Project.id.desc())
+    return [
+        ('index', 'ix_project_published_created',
+         db.select(Project.id).where(Project.is_published == True).order_by(*newest_projects).limit(13)),
+        ('profile', 'ix_project_user_published_created',
+         db.select(Project.id).where(Project.user_id == user_id, Project.is_published == True)
+         .order_by(*newest_projects).limit(10)),
+        ('feed', 'ix_timeline_entry_user_created_project',
+         db.select(TimelineEntry.project_id).where(TimelineEntry.user_id == user_id)
+         .order_by(TimelineEntry.created_at.desc(), TimelineEntry.project_id.desc()).limit(11)),
+        ('feed (authors merged at read time)', 'ix_project_user_published_created',
+         db.select(Project.id).where(Project.user_id.in_([user_id, user_id + 1]), Project.is_published == True)
+         .order_by(*newest_projects).limit(11)),
+        ('notifications', 'ix_notification_user_created',
+         db.select(Notification.id).where(Notification.user_id == user_id)
+         .order_by(Notification.created_at.desc(), Notification.id.desc()).limit(21)),
+        ('notifications (unread count)', 'ix_notification_user_created',
+         db.select(db.func.count(Notification.id)).where(Notification.user_id == user_id,
+                                                         Notification.created_at > datetime(2000, 1, 1))),
+        ('project_detail comments', 'ix_comment_project_parent_created',
+         db.select(Comment.id).where(Comment.project_id == project_id, Comment.parent_id.is_(None))
+         .order_by(Comment.created_at.desc(), Comment.id.desc()).limit(21)),
+        ('popularity refresh', 'ix_like_created',
+         db.select(Like.project_id, Like.created_at).where(Like.created_at >= datetime(2000, 1, 1),
+                                                           Like.created_at < datetime(2000, 1, 2))),
+        ('project likes', 'ix_like_project',
+         db.select(db.func.count(Like.id)).where(Like.project_id == project_id)),
+        ('followers', 'ix_follows_followed_follower',
+         db.select(follows.c.follower_id).where(follows.c.followed_id == user_id)),
+    ]
+
+def explain(conn, statement):
+    """The database's plan for statement, as text"""
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        return '\n'.join(row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}'))
+    return '\n'.join(row[0] for row in conn.exec_driver_sql(f'EXPLAIN {sql}'))
+
+def check_index_usage():
+    """EXPLAIN every hot listing query; returns [(name, expected index, used, plan)]"""
+    results = []
+    with db.engine.connect() as conn:
+        with conn.begin() as transaction:
+            if conn.dialect.name == 'postgresql':
+                # Tiny dev tables make a seq scan cheapest; the question is whether the index is usable
+                conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            for name, index, statement in _hot_queries():
+                plan = explain(conn, statement)
+                results.append((name, index, index in plan, plan))
+            transaction.rollback()
+    return results
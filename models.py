@@ -1,5 +1,6 @@
 from datetime import datetime
 from app import db
+from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -8,6 +9,8 @@ follows = db.Table('follows',
     db.Column('follower_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
     db.Column('followed_id', db.Integer, db.ForeignKey('user.id'), primary_key=True)
 )
+# The primary key serves "who does X follow"; this serves followers pages
+db.Index('ix_follows_followed_follower', follows.c.followed_id, follows.c.follower_id)
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -25,6 +28,14 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Denormalized counters, kept in sync by the routes and reconcile_counters()
+    follower_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    following_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    project_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    unread_notification_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Read watermark: notifications created after it are unread
+    notifications_read_at = db.Column(db.DateTime)
+    
     # Relationships (removed to avoid conflicts)
     likes = db.relationship('Like', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     comments = db.relationship('Comment', backref='author', lazy='dynamic', cascade='all, delete-orphan')
@@ -39,7 +50,7 @@ class User(UserMixin, db.Model):
         backref=db.backref('followers', lazy='dynamic'), lazy='dynamic')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, current_app.config['PASSWORD_HASH_METHOD'])
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -56,27 +67,53 @@ class User(UserMixin, db.Model):
         return self.username
     
     def follow(self, user):
-        if not self.is_following(user):
+        """Follow user; returns True if this added a new follow"""
+        if not self._follows_in_db(user):
             self.followed.append(user)
+            db.session.add(FollowEvent(follower_id=self.id, followed_id=user.id, added=True))
+            adjust_counter(User, self.id, 'following_count', 1)
+            adjust_counter(User, user.id, 'follower_count', 1)
+            return True
+        return False
     
     def unfollow(self, user):
-        if self.is_following(user):
+        """Unfollow user; returns True if a follow was removed"""
+        if self._follows_in_db(user):
             self.followed.remove(user)
+            db.session.add(FollowEvent(follower_id=self.id, followed_id=user.id, added=False))
+            adjust_counter(User, self.id, 'following_count', -1)
+            adjust_counter(User, user.id, 'follower_count', -1)
+            return True
+        return False
     
-    def is_following(self, user):
+    def _follows_in_db(self, user):
+        # Authoritative check for writes; reads go through the in-memory follow graph
         return self.followed.filter(follows.c.followed_id == user.id).count() > 0
     
+    def is_following(self, user):
+        from follow_graph import get_graph
+        return get_graph().is_following(self.id, user.id)
+    
     def get_follower_count(self):
-        return User.query.join(follows, User.id == follows.c.follower_id).filter(follows.c.followed_id == self.id).count()
+        return self.follower_count
     
     def get_following_count(self):
-        return self.followed.count()
+        return self.following_count
     
     def get_project_count(self):
-        return Project.query.filter_by(user_id=self.id, is_published=True).count()
+        return self.project_count
     
     def get_unread_notification_count(self):
-        return self.notifications.filter_by(read=False).count()
+        return self.unread_notification_count
+
+# Weighted full-text vector over the searchable fields. On PostgreSQL it backs
+# a GIN expression index, so search.py must query this exact expression.
+PROJECT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(tags, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(content, '')), 'C')"
+)
 
 class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -93,6 +130,19 @@ class Project(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Denormalized counters, kept in sync by the routes and reconcile_counters()
+    like_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    comment_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
+    # Listing indexes; migrations.py builds them on existing databases and checks the plans
+    __table_args__ = (
+        db.Index('ix_project_published_created', 'created_at', 'id',
+                 postgresql_where=is_published == True, sqlite_where=is_published == True),  # index
+        db.Index('ix_project_user_published_created', 'user_id', 'is_published', 'created_at', 'id'),  # profile, feed
+        db.Index('ix_project_search', db.text(f'({PROJECT_SEARCH_VECTOR})'),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),  # search
+    )
+    
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
@@ -100,20 +150,38 @@ class Project(db.Model):
     user = db.relationship('User', backref='projects_rel', lazy=True)
     likes = db.relationship('Like', backref='project', lazy='dynamic', cascade='all, delete-orphan')
     comments = db.relationship('Comment', backref='project', lazy='dynamic', cascade='all, delete-orphan')
+    tag_links = db.relationship('ProjectTag', cascade='all, delete-orphan', order_by='ProjectTag.position')
+    # Read-only view of tag_links; list queries should selectinload() this
+    tag_items = db.relationship('Tag', secondary='project_tag', order_by='ProjectTag.position', viewonly=True)
+    
+    # Filled in by preload_project_stats() so list pages don't query per card
+    _liked_by = None
     
     def get_like_count(self):
-        return self.likes.count()
+        return self.like_count
     
     def get_comment_count(self):
-        return self.comments.count()
+        return self.comment_count
     
     def is_liked_by(self, user):
+        if self._liked_by is not None and user.id in self._liked_by:
+            return self._liked_by[user.id]
         return self.likes.filter_by(user_id=user.id).first() is not None
     
     def get_tags_list(self):
-        if self.tags:
-            return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
-        return []
+        return [tag.label for tag in self.tag_items]
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False, index=True)  # Case-folded
+    label = db.Column(db.String(64), nullable=False)  # Display form from first use
+
+class ProjectTag(db.Model):
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id'), primary_key=True, index=True)
+    position = db.Column(db.Integer, default=0, nullable=False)
+    
+    tag = db.relationship('Tag')
 
 class Like(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -121,7 +189,11 @@ class Like(db.Model):
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'project_id', name='unique_user_project_like'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'project_id', name='unique_user_project_like'),
+        db.Index('ix_like_project', 'project_id'),
+        db.Index('ix_like_created', 'created_at'),  # popularity refresh
+    )
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -132,12 +204,27 @@ class Comment(db.Model):
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id'), index=True)  # Replies are one level deep
+    
+    # Denormalized counter, kept in sync by add_comment and reconcile_counters()
+    reply_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
+    parent = db.relationship('Comment', remote_side=[id], backref=db.backref('replies', lazy='dynamic'))
+    
+    # First replies of a thread, filled in by comments.load_reply_previews()
+    reply_preview = ()
+    
+    # Serves both the top-level page (parent_id IS NULL) and each thread's replies
+    __table_args__ = (
+        db.Index('ix_comment_project_parent_created', 'project_id', 'parent_id', 'created_at', 'id'),
+        db.Index('ix_comment_created', 'created_at'),  # popularity refresh
+    )
 
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50), nullable=False)  # 'like', 'comment', 'follow'
     message = db.Column(db.String(255), nullable=False)
-    read = db.Column(db.Boolean, default=False, nullable=False)
+    actor_count = db.Column(db.Integer, default=1, server_default='1', nullable=False)  # >1 when likes are coalesced
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Foreign Keys
@@ -148,3 +235,133 @@ class Notification(db.Model):
     # Relationships
     related_user = db.relationship('User', foreign_keys=[related_user_id], overlaps="trigger_user,triggered_notifications")
     project = db.relationship('Project', foreign_keys=[project_id])
+    actors = db.relationship('NotificationActor', cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_notification_user_created', 'user_id', 'created_at', 'id'),  # notifications page, unread counts
+    )
+
+class NotificationActor(db.Model):
+    """Everyone already counted in a (coalesced) like notification, so re-likes are not counted twice"""
+    notification_id = db.Column(db.Integer, db.ForeignKey('notification.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+
+class TimelineEntry(db.Model):
+    """Materialized home-feed row, written by timeline.py on fan-out"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False)  # Copy of Project.created_at for ordering
+    
+    __table_args__ = (db.Index('ix_timeline_entry_user_created_project', 'user_id', 'created_at', 'project_id'),)
+
+class SearchDocument(db.Model):
+    """Per-project length for BM25 in the portable search index (see search.py)"""
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    length = db.Column(db.Integer, nullable=False)
+
+class SearchPosting(db.Model):
+    """Inverted-index posting: weighted frequency of a term in a project"""
+    term = db.Column(db.String(64), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True, index=True)
+    frequency = db.Column(db.Float, nullable=False)
+
+class SearchTerm(db.Model):
+    """Number of indexed projects containing a term: the BM25 document frequency"""
+    term = db.Column(db.String(64), primary_key=True)
+    document_count = db.Column(db.Integer, nullable=False)
+
+class ProjectScore(db.Model):
+    """Time-decayed popularity score, maintained by popularity.refresh_scores()"""
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    score = db.Column(db.Float, default=0.0, nullable=False, index=True)
+    last_event_at = db.Column(db.DateTime)
+    
+    project = db.relationship('Project', backref=db.backref('popularity', uselist=False, cascade='all, delete-orphan'))
+
+class PopularityState(db.Model):
+    """Single-row watermark for incremental popularity refreshes"""
+    id = db.Column(db.Integer, primary_key=True)
+    epoch = db.Column(db.DateTime, nullable=False)  # Reference time for forward-decay weights
+    watermark = db.Column(db.DateTime)  # Interactions created before this are folded into the scores
+    refreshed_at = db.Column(db.DateTime, nullable=False)
+
+class FollowEvent(db.Model):
+    """Append-only log of follow changes, replayed by every worker's follow graph"""
+    id = db.Column(db.Integer, primary_key=True)
+    follower_id = db.Column(db.Integer, nullable=False)
+    followed_id = db.Column(db.Integer, nullable=False)
+    added = db.Column(db.Boolean, nullable=False)  # False for an unfollow
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class Blob(db.Model):
+    """Content-addressed upload (see blobstore.py); ref_count counts the columns pointing at path"""
+    id = db.Column(db.String(64), primary_key=True)  # SHA-256 of the stored bytes
+    path = db.Column(db.String(255), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # Last reference change
+
+class VideoUpload(db.Model):
+    """In-progress chunked video upload (see resumable.py); the bytes live in a .part file"""
+    id = db.Column(db.String(32), primary_key=True)  # Random token, also the .part file name
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    checksum = db.Column(db.String(64))  # Optional SHA-256 (hex) of the whole file
+    path = db.Column(db.String(255))  # Set once complete and moved into uploads/videos
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    @property
+    def is_complete(self):
+        return self.path is not None
+
+def adjust_counter(model, obj_id, field, delta):
+    """Atomically add delta to a counter column (UPDATE ... SET n = n + delta)"""
+    column = getattr(model, field)
+    db.session.execute(db.update(model).where(model.id == obj_id).values({column: column + delta}))
+
+def reconcile_counters():
+    """Recompute every denormalized counter from the source tables in bulk"""
+    db.session.execute(db.update(Project).values(
+        like_count=db.select(db.func.count(Like.id)).where(Like.project_id == Project.id).scalar_subquery(),
+        comment_count=db.select(db.func.count(Comment.id)).where(Comment.project_id == Project.id).scalar_subquery(),
+    ))
+    reply = db.aliased(Comment)
+    db.session.execute(db.update(Comment).values(
+        reply_count=db.select(db.func.count(reply.id)).where(reply.parent_id == Comment.id).scalar_subquery(),
+    ))
+    published = db.aliased(Project)
+    db.session.execute(db.update(User).values(
+        follower_count=db.select(db.func.count()).select_from(follows).where(
+            follows.c.followed_id == User.id).scalar_subquery(),
+        following_count=db.select(db.func.count()).select_from(follows).where(
+            follows.c.follower_id == User.id).scalar_subquery(),
+        project_count=db.select(db.func.count(published.id)).where(
+            published.user_id == User.id, published.is_published == True).scalar_subquery(),
+        unread_notification_count=db.select(db.func.count(Notification.id)).where(
+            Notification.user_id == User.id, db.or_(User.notifications_read_at.is_(None),
+                                                    Notification.created_at > User.notifications_read_at)
+        ).scalar_subquery(),
+    ))
+    db.session.commit()
+
+def preload_project_stats(projects, user=None):
+    """Batch-load the user's likes for a page of projects.
+
+    Like and comment counts live on the project row; this fills in the
+    viewer's liked state with one query so is_liked_by() reads from memory
+    while rendering instead of querying per card.
+    """
+    projects = list(projects)
+    ids = [project.id for project in projects]
+    if not ids or user is None or not user.is_authenticated:
+        return projects
+    
+    liked_ids = {
+        project_id for (project_id,) in
+        db.session.query(Like.project_id).filter(Like.user_id == user.id, Like.project_id.in_(ids))
+    }
+    for project in projects:
+        project._liked_by = {user.id: project.id in liked_ids}
+    return projects
@@ -0,0 +1,287 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import User, Notification, NotificationActor, adjust_counter, db
+from broker import get_broker
+from identity import forget_identity
+
+class NotificationQueue:
+    """Collects notifications from requests and writes them in batches.
+
+    Requests only enqueue; a background thread drains the queue every
+    NOTIFICATION_FLUSH_INTERVAL seconds, cancels like/unlike flapping,
+    folds bursts of likes on the same project into one "X and N others"
+    row and inserts the rest with a single executemany.
+    """
+    
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._app = None
+        self._lock = threading.Lock()
+    
+    def _ensure_worker(self):
+        # Started lazily so each forked gunicorn worker gets its own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._app = current_app._get_current_object()
+            self._queue = queue.Queue(maxsize=self._app.config['NOTIFICATION_QUEUE_SIZE'])
+            self._thread = threading.Thread(target=self._run, name='notification-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+    
+    def put(self, event):
+        if not current_app.config['NOTIFICATION_QUEUE_ASYNC']:
+            _write_in_request(event)
+            return
+        # Held until the request's transaction commits (see _publish_after_commit),
+        # so a like, follow or comment that rolls back never notifies anyone
+        db.session.info.setdefault('queued_notifications', []).append(event)
+    
+    def put_committed(self, events):
+        self._ensure_worker()
+        overflow = []
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                overflow.append(event)
+        if overflow:
+            # Back-pressure: write these in the request rather than drop them
+            logging.warning('Notification queue full; writing %d synchronously', len(overflow))
+            self._write(overflow)
+    
+    def _drain(self):
+        batch = []
+        limit = self._app.config['NOTIFICATION_BATCH_SIZE']
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def flush(self):
+        """Write everything queued so far (used at shutdown and in tests)"""
+        if self._queue is None:
+            return
+        while True:
+            batch = self._drain()
+            if not batch:
+                return
+            self._write(batch)
+    
+    def _write(self, batch):
+        with self._app.app_context():
+            try:
+                user_ids = write_batch(batch)
+                db.session.commit()
+                publish_unread_counts(user_ids)
+            except Exception:
+                db.session.rollback()
+                logging.exception('Failed to write %d notifications', len(batch))
+    
+    def _run(self):
+        interval = self._app.config['NOTIFICATION_FLUSH_INTERVAL']
+        while True:
+            # Block for the first event, then give a burst time to accumulate
+            first = self._queue.get()
+            time.sleep(interval)
+            self._write([first] + self._drain())
+
+def _write_in_request(event):
+    # Part of the request's transaction: the caller commits, and badges are
+    # only pushed once that commit happened (see _publish_after_commit)
+    db.session.info.setdefault('unread_changed', set()).update(write_batch([event]))
+
+@event.listens_for(Session, 'after_commit')
+def _publish_after_commit(session):
+    events = session.info.pop('queued_notifications', None)
+    if events:
+        notification_queue.put_committed(events)
+    user_ids = session.info.pop('unread_changed', None)
+    if user_ids:
+        publish_unread_counts(user_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_unread_changed(session):
+    session.info.pop('queued_notifications', None)
+    session.info.pop('unread_changed', None)
+
+def _event_key(event):
+    return event['user_id'], event['type'], event['project_id'], event['related_user_id']
+
+def _like_message(actor_name, others, title):
+    if others:
+        people = 'pessoa' if others == 1 else 'pessoas'
+        return f'{actor_name} e mais {others} {people} curtiram seu projeto "{title}"'
+    return f'{actor_name} curtiu seu projeto "{title}"'
+
+def _is_unread(created_at, read_at):
+    return read_at is None or created_at > read_at
+
+def write_batch(events):
+    """Apply a batch of queued events to the session (the caller commits).
+
+    Returns the ids of users whose unread count changed.
+    """
+    # Later events win; a retract cancels a pending like from the same actor
+    pending = OrderedDict()
+    for event in events:
+        key = _event_key(event)
+        pending.pop(key, None)
+        if event['action'] == 'add':
+            pending[key] = event
+    
+    likes = [event for event in pending.values() if event['type'] == 'like']
+    others = [event for event in pending.values() if event['type'] != 'like']
+    # Read watermarks of every recipient; an event can predate one when the
+    # user opened their notifications while it sat in the queue
+    read_at = dict(db.session.query(User.id, User.notifications_read_at).filter(
+        User.id.in_({event['user_id'] for event in pending.values()}))) if pending else {}
+    
+    if likes:
+        # Skip actors that were already notified for this project (unlike/like flapping)
+        project_ids = {event['project_id'] for event in likes}
+        user_ids = {event['user_id'] for event in likes}
+        existing = db.session.query(
+            Notification.id, Notification.user_id, Notification.project_id, Notification.created_at
+        ).filter(
+            Notification.type == 'like',
+            Notification.user_id.in_(user_ids),
+            Notification.project_id.in_(project_ids)
+        ).all()
+        # Every actor counted in any of those rows, not just the latest one shown
+        notified = set(db.session.query(
+            Notification.user_id, Notification.project_id, NotificationActor.user_id
+        ).join(NotificationActor).filter(Notification.id.in_([row.id for row in existing])))
+        unread = {(row.user_id, row.project_id): row.id for row in existing
+                  if _is_unread(row.created_at, read_at.get(row.user_id))}
+        
+        groups = OrderedDict()
+        for event in likes:
+            if (event['user_id'], event['project_id'], event['related_user_id']) not in notified:
+                groups.setdefault((event['user_id'], event['project_id']), []).append(event)
+        
+        for key, group in groups.items():
+            latest = group[-1]
+            if key in unread:
+                # Roll the burst into the unread notification already in the inbox
+                notification = db.session.get(Notification, unread[key])
+                notification.actor_count += len(group)
+                notification.related_user_id = latest['related_user_id']
+                notification.created_at = latest['created_at']
+                notification.message = _like_message(
+                    latest['actor_name'], notification.actor_count - 1, latest['project_title'])
+                db.session.add_all(NotificationActor(notification_id=notification.id, user_id=event['related_user_id'])
+                                   for event in group)
+            else:
+                others.append(dict(latest, actor_count=len(group), actor_ids=[
+                    event['related_user_id'] for event in group], message=_like_message(
+                    latest['actor_name'], len(group) - 1, latest['project_title'])))
+    
+    new_unread = {}
+    for event in others:
+        if _is_unread(event['created_at'], read_at.get(event['user_id'])):
+            new_unread[event['user_id']] = new_unread.get(event['user_id'], 0) + 1
+    for user_id, count in new_unread.items():
+        adjust_counter(User, user_id, 'unread_notification_count', count)
+    
+    if others:
+        inserted = db.session.execute(db.insert(Notification).returning(
+            Notification.id, sort_by_parameter_order=True), [
+            {
+                'user_id': event['user_id'],
+                'type': event['type'],
+                'message': event['message'],
+                'related_user_id': event['related_user_id'],
+                'project_id': event['project_id'],
+                'actor_count': event.get('actor_count', 1),
+                'created_at': event['created_at'],
+            }
+            for event in others
+        ]).scalars()
+        actors = [{'notification_id': notification_id, 'user_id': actor_id}
+                  for notification_id, event in zip(inserted, others) for actor_id in event.get('actor_ids', ())]
+        if actors:
+            db.session.execute(db.insert(NotificationActor), actors)
+    return set(new_unread)
+
+def publish_unread_counts(user_ids):
+    """Push the current unread count of each user to their open badge streams"""
+    if not user_ids:
+        return
+    forget_identity(*user_ids)
+    broker = get_broker()
+    # Own connection, so this also works from after_commit, when the session cannot run SQL
+    with db.engine.connect() as conn:
+        counts = conn.execute(db.select(User.id, User.unread_notification_count).where(
+            User.id.in_(user_ids))).all()
+    for user_id, unread in counts:
+        broker.publish(user_id, {'unread': unread})
+
+def mark_all_read(user_id):
+    """Move the user's read watermark to now; returns (previous watermark, how many were unread).
+
+    One UPDATE of the user row instead of rewriting every unread
+    notification, skipped entirely when nothing is unread. The caller commits.
+    """
+    read_at, unread = db.session.query(User.notifications_read_at, User.unread_notification_count).filter(
+        User.id == user_id).one()
+    if unread:
+        db.session.execute(db.update(User).where(User.id == user_id).values(
+            notifications_read_at=datetime.utcnow(), unread_notification_count=0))
+    return read_at, unread
+
+def compact_notifications():
+    """Delete read notifications older than NOTIFICATION_RETENTION_DAYS; returns how many.
+
+    Works through the oldest rows in NOTIFICATION_COMPACT_BATCH sized
+    chunks, each its own short transaction, so inserts into the table
+    and mark-all-read never wait on the job for long.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=current_app.config['NOTIFICATION_RETENTION_DAYS'])
+    batch_size = current_app.config['NOTIFICATION_COMPACT_BATCH']
+    pause = current_app.config['NOTIFICATION_COMPACT_PAUSE']
+    expired = (db.select(Notification.id)
+               .join(User, User.id == Notification.user_id)
+               .where(Notification.created_at < cutoff, Notification.created_at <= User.notifications_read_at)
+               .order_by(Notification.id).limit(batch_size))
+    removed = last_id = 0
+    while True:
+        # Resume after the last chunk so old unread rows are not rescanned every time
+        ids = db.session.execute(expired.where(Notification.id > last_id)).scalars().all()
+        if ids:
+            db.session.execute(db.delete(NotificationActor).where(NotificationActor.notification_id.in_(ids)))
+            db.session.execute(db.delete(Notification).where(Notification.id.in_(ids)))
+            last_id = ids[-1]
+        db.session.commit()
+        removed += len(ids)
+        if len(ids) < batch_size:
+            return removed
+        time.sleep(pause)
+
+notification_queue = NotificationQueue()
+
+def enqueue(action, user, notification_type, message=None, related_user=None, project=None):
+    notification_queue.put({
+        'action': action,
+        'user_id': user.id,
+        'type': notification_type,
+        'message': message,
+        'related_user_id': related_user.id if related_user else None,
+        'actor_name': related_user.display_name if related_user else None,
+        'project_id': project.id if project else None,
+        'project_title': project.title if project else None,
+        'created_at': datetime.utcnow(),
+    })
@@ -0,0 +1,73 @@
+import base64
+import json
+from datetime import datetime
+from models import db
+
+class CursorPage:
+    """One page of keyset-paginated results with opaque next/prev cursors"""
+    
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+    
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def encode_cursor(created_at, item_id, direction):
+    """Pack a (created_at, id) position into a URL-safe token"""
+    payload = json.dumps([created_at.isoformat(), item_id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Unpack a cursor token; returns None for missing or malformed tokens"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, item_id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ('next', 'prev'):
+            return None
+        return datetime.fromisoformat(created_at), int(item_id), direction
+    except (ValueError, TypeError):
+        return None
+
+def _default_key(item):
+    return item.created_at, item.id
+
+def paginate_keyset(query, created_col, id_col, cursor=None, per_page=20, key=_default_key):
+    """Fetch one page ordered by (created_col, id_col) descending.
+
+    Instead of OFFSET and a COUNT(*), the page starts right after the row
+    encoded in the cursor, so every page costs one indexed range read no
+    matter how deep it is. key maps a result item back to its
+    (created_at, id) position.
+    """
+    position = decode_cursor(cursor)
+    boundary = db.tuple_(created_col, id_col)
+    
+    if position is None:
+        rows = query.order_by(created_col.desc(), id_col.desc()).limit(per_page + 1).all()
+        has_more, items = len(rows) > per_page, rows[:per_page]
+        has_next, has_prev = has_more, False
+    elif position[2] == 'next':
+        rows = query.filter(boundary < db.tuple_(position[0], position[1])).order_by(
+            created_col.desc(), id_col.desc()).limit(per_page + 1).all()
+        has_more, items = len(rows) > per_page, rows[:per_page]
+        has_next, has_prev = has_more, True
+    else:
+        rows = query.filter(boundary > db.tuple_(position[0], position[1])).order_by(
+            created_col.asc(), id_col.asc()).limit(per_page + 1).all()
+        has_more, items = len(rows) > per_page, rows[:per_page][::-1]
+        has_next, has_prev = True, has_more
+    
+    if not items:
+        return CursorPage(items)
+    next_cursor = encode_cursor(*key(items[-1]), 'next') if has_next else None
+    prev_cursor = encode_cursor(*key(items[0]), 'prev') if has_prev else None
+    return CursorPage(items, next_cursor, prev_cursor)
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.orm import joinedload, selectinload
+from models import Project, Like, Comment, ProjectScore, PopularityState, db
+
+# Relative weight of each interaction type
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+
+STATE_ID = 1
+
+_snapshot = {'ids': [], 'loaded_at': 0.0}
+_snapshot_lock = threading.Lock()
+
+def _decay_weight(base, created_at, epoch):
+    """Forward-decay weight: base * 2^((t - epoch) / half_life).
+
+    Newer events weigh exponentially more than older ones, so scores never
+    have to be decayed in place and ordering stays stable between refreshes.
+    """
+    half_life = current_app.config['POPULARITY_HALF_LIFE_HOURS'] * 3600
+    return base * 2 ** ((created_at - epoch).total_seconds() / half_life)
+
+def _collect_events(since, until):
+    """Yield (weight, project_id, created_at) for interactions created in [since, until)"""
+    likes = db.session.query(Like.project_id, Like.created_at).filter(
+        Like.created_at >= since, Like.created_at < until)
+    comments = db.session.query(Comment.project_id, Comment.created_at).filter(
+        Comment.created_at >= since, Comment.created_at < until)
+    for project_id, created_at in likes.yield_per(1000):
+        yield LIKE_WEIGHT, project_id, created_at
+    for project_id, created_at in comments.yield_per(1000):
+        yield COMMENT_WEIGHT, project_id, created_at
+
+def _aggregate(events, epoch):
+    """Sum decayed weights per project; returns (scores, last_seen)"""
+    scores, last_seen = {}, {}
+    for weight, project_id, created_at in events:
+        scores[project_id] = scores.get(project_id, 0.0) + _decay_weight(weight, created_at, epoch)
+        if project_id not in last_seen or created_at > last_seen[project_id]:
+            last_seen[project_id] = created_at
+    return scores, last_seen
+
+def _settled_until(now):
+    # Rows are only folded in once POPULARITY_SETTLE_SECONDS old. Ids and
+    # created_at are assigned before commit, so a transaction that commits
+    # late still lands behind a watermark taken from max(id) or now(); the
+    # settle delay gives it time to become visible first.
+    return now - timedelta(seconds=current_app.config['POPULARITY_SETTLE_SECONDS'])
+
+def _rebuild_due(state, now):
+    # The epoch is the window start of the last rebuild
+    window = timedelta(days=current_app.config['POPULARITY_WINDOW_DAYS'])
+    return now - window - state.epoch >= timedelta(hours=current_app.config['POPULARITY_REBUILD_HOURS'])
+
+def rebuild_scores():
+    """Recompute all scores from interactions inside the popularity window.
+
+    The incremental refresh only ever adds weight, so this is what drops
+    removed likes and comments and re-anchors the decay epoch before the
+    weights grow too large; refresh_scores() runs it every
+    POPULARITY_REBUILD_HOURS. Claims the state row like refresh_scores()
+    and returns False if another worker got there first.
+    """
+    now = datetime.utcnow()
+    window_start = now - timedelta(days=current_app.config['POPULARITY_WINDOW_DAYS'])
+    watermark = _settled_until(now)
+    
+    scores, last_seen = _aggregate(_collect_events(window_start, watermark), window_start)
+    
+    state = db.session.get(PopularityState, STATE_ID)
+    if state is None:
+        db.session.add(PopularityState(id=STATE_ID, epoch=window_start, watermark=watermark, refreshed_at=now))
+    elif not db.session.execute(
+        db.update(PopularityState)
+        .where(PopularityState.id == STATE_ID, PopularityState.refreshed_at == state.refreshed_at)
+        .values(epoch=window_start, watermark=watermark, refreshed_at=now)
+    ).rowcount:
+        db.session.rollback()
+        return False
+    
+    ProjectScore.query.delete()
+    db.session.bulk_insert_mappings(ProjectScore, [
+        {'project_id': project_id, 'score': score, 'last_event_at': last_seen[project_id]}
+        for project_id, score in scores.items()
+    ])
+    db.session.commit()
+    _invalidate_snapshot()
+    return True
+
+def refresh_scores():
+    """Fold likes and comments created since the last run into the scores.
+
+    Only rows between the stored time watermark and the settle horizon are
+    read, so the cost tracks new activity rather than total history. The
+    state row is updated with a compare-and-set on refreshed_at, so
+    concurrent workers can't apply the same batch twice, and scores are
+    incremented in SQL rather than overwritten. Falls back to a full
+    rebuild_scores() when none was done yet or the last one is older than
+    POPULARITY_REBUILD_HOURS. Returns False if another worker won the race.
+    """
+    now = datetime.utcnow()
+    state = db.session.get(PopularityState, STATE_ID)
+    if state is None or state.watermark is None or _rebuild_due(state, now):
+        return rebuild_scores()
+    
+    until = _settled_until(now)
+    if until <= state.watermark:
+        return True
+    scores, last_seen = _aggregate(_collect_events(state.watermark, until), state.epoch)
+    
+    claimed = db.session.execute(
+        db.update(PopularityState)
+        .where(PopularityState.id == STATE_ID, PopularityState.refreshed_at == state.refreshed_at)
+        .values(watermark=until, refreshed_at=now)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return False
+    
+    if scores:
+        existing = set(db.session.execute(db.select(ProjectScore.project_id).where(
+            ProjectScore.project_id.in_(scores))).scalars())
+        for project_id in existing:
+            seen = last_seen[project_id]
+            db.session.execute(db.update(ProjectScore).where(ProjectScore.project_id == project_id).values(
+                score=ProjectScore.score + scores[project_id],
+                last_event_at=db.case((db.or_(ProjectScore.last_event_at.is_(None),
+                                              ProjectScore.last_event_at < seen), seen),
+                                      else_=ProjectScore.last_event_at)))
+        new_rows = [{'project_id': project_id, 'score': score, 'last_event_at': last_seen[project_id]}
+                    for project_id, score in scores.items() if project_id not in existing]
+        if new_rows:
+            db.session.execute(db.insert(ProjectScore), new_rows)
+    db.session.commit()
+    return True
+
+class _Refresher:
+    """Runs refresh_scores() every POPULARITY_REFRESH_SECONDS in a background thread"""
+    
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def ensure_running(self):
+        # Started lazily so each forked gunicorn worker gets its own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            app = current_app._get_current_object()
+            self._thread = threading.Thread(target=self._run, args=(app,), name='popularity-refresh', daemon=True)
+            self._thread.start()
+    
+    def _run(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    if refresh_scores():
+                        _invalidate_snapshot()
+                except Exception:
+                    db.session.rollback()
+                    logging.exception('Popularity refresh failed')
+            time.sleep(app.config['POPULARITY_REFRESH_SECONDS'])
+
+_refresher = _Refresher()
+
+def _invalidate_snapshot():
+    with _snapshot_lock:
+        _snapshot['loaded_at'] = 0.0
+
+def get_popular_projects(limit=6):
+    """Return the top published projects from the last POPULARITY_WINDOW_DAYS.
+
+    The ranked ids are held in a per-process snapshot and only reloaded
+    every POPULARITY_REFRESH_SECONDS, so a homepage hit costs a single
+    primary-key lookup for the projects themselves. Scores are folded in
+    by a background thread (or `flask refresh-popularity` from cron), so
+    this only ever reads.
+    """
+    if current_app.config['POPULARITY_REFRESH_IN_BACKGROUND']:
+        _refresher.ensure_running()
+    refresh_every = current_app.config['POPULARITY_REFRESH_SECONDS']
+    with _snapshot_lock:
+        stale = time.monotonic() - _snapshot['loaded_at'] > refresh_every
+        ids = _snapshot['ids']
+    
+    if stale:
+        window_start = datetime.utcnow() - timedelta(days=current_app.config['POPULARITY_WINDOW_DAYS'])
+        ids = [project_id for (project_id,) in db.session.query(ProjectScore.project_id).join(Project).filter(
+            Project.is_published == True,
+            ProjectScore.last_event_at >= window_start
+        ).order_by(ProjectScore.score.desc()).limit(limit)]
+        with _snapshot_lock:
+            _snapshot['ids'] = ids
+            _snapshot['loaded_at'] = time.monotonic()
+    
+    if not ids:
+        return []
+    query = Project.query.options(joinedload(Project.user), selectinload(Project.tag_items)).filter(
+        Project.id.in_(ids), Project.is_published == True)
+    projects = {project.id: project for project in query}
+    return [projects[project_id] for project_id in ids[:limit] if project_id in projects]
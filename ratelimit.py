@@ -0,0 +1,73 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+class LocalBuckets:
+    """Token buckets in this worker only; idle buckets are evicted oldest first"""
+
+    def __init__(self, max_keys=100000):
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._max_keys = max_keys
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+# Refill and take in one round trip, so concurrent workers cannot both spend the last token
+_TAKE_SCRIPT = """
+local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local retry_after = 0
+if tokens >= 1 then tokens = tokens - 1 else retry_after = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+class RedisBuckets:
+    """Token buckets shared by every worker"""
+
+    def __init__(self, url):
+        import redis  # Optional dependency, only needed for multi-worker deployments
+        self._take = redis.Redis.from_url(url).register_script(_TAKE_SCRIPT)
+
+    def take(self, key, capacity, rate):
+        return float(self._take(keys=[f'nexus:ratelimit:{key}'], args=[capacity, rate, time.time()]))
+
+_buckets = None
+_buckets_lock = threading.Lock()
+
+def get_buckets():
+    """The bucket store configured by RATE_LIMIT_URL (per-worker when unset)"""
+    global _buckets
+    if _buckets is None:
+        with _buckets_lock:
+            if _buckets is None:
+                url = current_app.config.get('RATE_LIMIT_URL')
+                _buckets = RedisBuckets(url) if url else LocalBuckets()
+    return _buckets
+
+def hit(limit, key):
+    """Spend one token from the RATE_LIMITS[limit] bucket for key; returns seconds to wait (0: allowed)"""
+    capacity, rate = current_app.config['RATE_LIMITS'][limit]
+    return get_buckets().take(f'{limit}:{key}', capacity, rate)
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
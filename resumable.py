@@ -0,0 +1,213 @@
+import base64
+import fcntl
+import hashlib
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from models import VideoUpload
+from blobstore import adopt_file
+
+# Chunks are copied from the request stream in pieces of this size, so a
+# worker holds at most one buffer per upload regardless of chunk size.
+COPY_BUFFER = 64 * 1024
+
+# upload id -> (offset, sha256 of the first offset bytes), so finishing an
+# upload never re-reads the file. Per worker: a worker that did not see
+# earlier chunks catches up by hashing only the bytes it missed.
+_running = OrderedDict()
+_running_lock = threading.Lock()
+RUNNING_HASHES = 1000
+
+class UploadError(Exception):
+    """Rejected upload request; status is the HTTP status to answer with"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def _tmp_dir():
+    path = current_app.config['VIDEO_UPLOAD_TMP'] or os.path.join(current_app.instance_path, 'partial_uploads')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def part_path(upload):
+    return os.path.join(_tmp_dir(), f'{upload.id}.part')
+
+def current_offset(upload):
+    """Bytes received so far; the .part file is the source of truth"""
+    if upload.is_complete:
+        return upload.size
+    try:
+        return os.path.getsize(part_path(upload))
+    except FileNotFoundError:
+        return 0
+
+def start_upload(user, filename, size, checksum=None):
+    """Open a new upload session and its empty .part file"""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in current_app.config['VIDEO_EXTENSIONS']:
+        raise UploadError('Formato de vídeo não suportado')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('Tamanho de arquivo inválido')
+    if size > current_app.config['VIDEO_MAX_SIZE']:
+        raise UploadError('Arquivo muito grande', 413)
+    if checksum is not None:
+        checksum = checksum.lower()
+        if len(checksum) != 64 or any(c not in '0123456789abcdef' for c in checksum):
+            raise UploadError('Checksum inválido')
+
+    upload = VideoUpload(id=secrets.token_hex(16), user_id=user.id,
+                         filename=os.path.basename(filename), size=size, checksum=checksum)
+    db.session.add(upload)
+    db.session.commit()
+    open(part_path(upload), 'wb').close()
+    return upload
+
+def _parse_chunk_checksum(header):
+    # Same shape as the tus checksum extension: "sha256 <base64 digest>"
+    if not header:
+        return None
+    algorithm, _, value = header.partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise UploadError('Algoritmo de checksum não suportado')
+    try:
+        return base64.b64decode(value, validate=True)
+    except ValueError:
+        raise UploadError('Checksum inválido')
+
+def _running_hash(upload, part, received):
+    # The .part file only ever grows past bytes already hashed, so a cached
+    # state is extended from its offset; one ahead of the file (a chunk
+    # rolled back elsewhere) is useless and hashing restarts from zero
+    with _running_lock:
+        offset, digest = _running.pop(upload.id, (0, None))
+    if digest is None or offset > received:
+        offset, digest = 0, hashlib.sha256()
+    part.seek(offset)
+    while offset < received:
+        buffer = part.read(min(COPY_BUFFER, received - offset))
+        if not buffer:
+            break
+        digest.update(buffer)
+        offset += len(buffer)
+    return digest
+
+def _remember_hash(upload, offset, digest):
+    with _running_lock:
+        _running[upload.id] = (offset, digest)
+        while len(_running) > RUNNING_HASHES:
+            _running.popitem(last=False)
+
+def _forget_hash(upload):
+    with _running_lock:
+        _running.pop(upload.id, None)
+
+def append_chunk(upload, offset, stream, length, checksum_header=None):
+    """Append one chunk at offset, streaming it straight to disk.
+
+    The chunk is rejected (and the .part file truncated back) if the
+    offset does not match what was already received, the length would
+    overflow the declared size, or its per-chunk checksum does not match.
+    The offset check, the write and finishing the upload all happen under
+    an exclusive lock on the .part file, so concurrent PATCHes for the
+    same upload are serialized. Returns the new offset.
+    """
+    if upload.is_complete:
+        raise UploadError('Upload já concluído', 409)
+    expected = _parse_chunk_checksum(checksum_header)
+    path = part_path(upload)
+    try:
+        part = open(path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Upload já concluído', 409)
+
+    with part:
+        fcntl.flock(part, fcntl.LOCK_EX)
+        # Whoever held the lock before may have finished (moved) or discarded the file
+        try:
+            if not os.path.samestat(os.fstat(part.fileno()), os.stat(path)):
+                raise FileNotFoundError(path)
+        except FileNotFoundError:
+            raise UploadError('Upload já concluído', 409)
+        received = os.fstat(part.fileno()).st_size
+        if offset != received:
+            raise UploadError('Offset não corresponde ao recebido', 409)
+        if length is None or offset + length > upload.size:
+            raise UploadError('Bloco excede o tamanho declarado', 413)
+
+        running = _running_hash(upload, part, received)
+        before = running.copy()
+        chunk_digest = hashlib.sha256()
+        written = 0
+        part.seek(offset)
+        try:
+            while written < length:
+                buffer = stream.read(min(COPY_BUFFER, length - written))
+                if not buffer:
+                    break
+                part.write(buffer)
+                chunk_digest.update(buffer)
+                running.update(buffer)
+                written += len(buffer)
+            if written != length:
+                raise UploadError('Bloco incompleto')
+            if expected is not None and chunk_digest.digest() != expected:
+                raise UploadError('Checksum do bloco não confere', 460)  # tus "checksum mismatch"
+        except BaseException:
+            # Drop whatever part of this chunk made it to disk so the client can resend it
+            part.truncate(offset)
+            _remember_hash(upload, offset, before)
+            raise
+        part.truncate(offset + written)
+        part.flush()
+
+        if offset + written == upload.size:
+            finish_upload(upload, running.hexdigest())
+        else:
+            _remember_hash(upload, offset + written, running)
+    return offset + written
+
+def finish_upload(upload, digest):
+    """Verify the whole-file checksum and move the file into the upload store"""
+    _forget_hash(upload)
+    source = part_path(upload)
+    if upload.checksum and digest != upload.checksum:
+        discard_upload(upload)
+        raise UploadError('Checksum do arquivo não confere', 422)
+
+    extension = os.path.splitext(upload.filename)[1].lower()
+    upload.path = adopt_file(source, 'videos', extension, digest)
+    db.session.commit()
+
+def claim_upload(upload_id, user):
+    """Hand a completed upload's path over to a project and forget the session"""
+    upload = db.session.get(VideoUpload, upload_id or '')
+    if upload is None or upload.user_id != user.id or not upload.is_complete:
+        return None
+    path = upload.path
+    db.session.delete(upload)
+    return path
+
+def discard_upload(upload):
+    """Abort an upload: remove its session and any partial bytes.
+
+    A finished file is left to the blob store, which collects it once it
+    has stayed unreferenced past the grace period.
+    """
+    _forget_hash(upload)
+    if os.path.exists(part_path(upload)):
+        os.remove(part_path(upload))
+    db.session.delete(upload)
+    db.session.commit()
+
+def purge_stale_uploads():
+    """Discard sessions older than VIDEO_UPLOAD_EXPIRY_HOURS, finished or not; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config['VIDEO_UPLOAD_EXPIRY_HOURS'])
+    stale = VideoUpload.query.filter(VideoUpload.created_at < cutoff).all()
+    for upload in stale:
+        discard_upload(upload)
+    return len(stale)
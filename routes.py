@@ -1,44 +1,133 @@
 import os
-from flask import render_template, url_for, flash, redirect, request, abort, jsonify, send_from_directory
+import json
+import threading
+import time
+from flask import render_template, render_template_string, url_for, flash, redirect, request, abort, jsonify, send_from_directory, Response, stream_with_context, make_response
 from flask_login import login_user, current_user, logout_user, login_required
 from urllib.parse import urlparse as url_parse
+from markupsafe import Markup, escape
+from sqlalchemy.orm import joinedload, selectinload
 from app import app, db
-from models import User, Project, Like, Comment, Notification, follows
-from forms import LoginForm, RegistrationForm, EditProfileForm, ProjectForm, CommentForm
-from utils import save_picture, create_notification, get_file_url
+from models import User, Project, Comment, Notification, Tag, ProjectTag, VideoUpload, follows, adjust_counter, preload_project_stats
+from forms import LoginForm, RegistrationForm, EditProfileForm, ProjectForm, CommentForm, CATEGORY_CHOICES
+from utils import save_picture, create_notification, retract_notification, get_file_url
+from popularity import get_popular_projects
+from pagination import paginate_keyset
+from search import search_projects, suggest_projects, index_project, unindex_project
+from tags import set_project_tags, trending_tags
+from broker import get_broker
+from notifier import mark_all_read
+from images import variant_url
+from fileserver import send_upload
+from blobstore import replace_reference
+from cache import cached_page, cache_fragment, add_tags
+from resumable import UploadError, start_upload, append_chunk, current_offset, claim_upload, discard_upload
+from follow_graph import get_graph
+from likes import set_like, unset_like
+from identity import forget_identity, fresh_user
+from comments import comment_page, reply_page, thread_parent
+from auth import AuthUnavailable, hash_password, verify_password, limit_attempt
+from ratelimit import retry_after_header
+import timeline
+
+@app.template_global()
+def image_url(path, variant, fmt='webp'):
+    """Template helper: URL of a processed image variant (or its placeholder)"""
+    return variant_url(path, variant, fmt)
+
+app.add_template_global(get_file_url)
+app.add_template_global(cache_fragment)
+app.add_template_global(trending_tags)
+
+@app.template_filter('nl2br')
+def nl2br(text):
+    """Escape text and turn its line breaks into <br> tags"""
+    return Markup('<br>\n').join(escape(text or '').splitlines())
 
 # Serve uploaded files
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return send_upload(filename)
 
 @app.route('/')
+@cached_page(timeout=60)  # Short: the popular section follows the score refresh
 def index():
     """Homepage - shows recent and popular projects"""
-    page = request.args.get('page', 1, type=int)
-    projects = Project.query.filter_by(is_published=True).order_by(Project.created_at.desc()).paginate(
-        page=page, per_page=12, error_out=False)
+    cursor = request.args.get('cursor')
+    query = Project.query.options(joinedload(Project.user), selectinload(Project.tag_items)).filter_by(is_published=True)
+    projects = paginate_keyset(query, Project.created_at, Project.id, cursor, per_page=12)
+    
+    # Get popular projects (time-decayed likes and comments, last 30 days)
+    popular_projects = get_popular_projects(6)
     
-    # Get popular projects (most liked in last 30 days)
-    popular_projects = Project.query.filter_by(is_published=True).join(Like).group_by(Project.id).order_by(db.func.count(Like.id).desc()).limit(6).all()
+    preload_project_stats(projects.items + popular_projects, current_user)
+    add_tags('projects')
     
     return render_template('index.html', projects=projects, popular_projects=popular_projects)
 
+@app.route('/search')
+def search():
+    """Full-text project search with optional category filter"""
+    query = request.args.get('q', '').strip()
+    category = request.args.get('category') or None
+    page = request.args.get('page', 1, type=int)
+    projects, has_next = search_projects(query, category, page=page, per_page=12)
+    preload_project_stats(projects, current_user)
+    
+    return render_template('search.html', query=query, category=category, categories=CATEGORY_CHOICES,
+                           projects=projects, page=page, has_next=has_next)
+
+@app.route('/search/suggest')
+def search_suggest():
+    """Autocomplete for the navbar search box"""
+    projects = suggest_projects(request.args.get('q', ''))
+    return jsonify({'suggestions': [
+        {'id': project.id, 'title': project.title, 'url': url_for('project_detail', id=project.id)}
+        for project in projects
+    ]})
+
+@app.route('/tag/<path:name>')
+def tag(name):
+    """Published projects carrying a tag, newest first"""
+    if name != name.casefold():
+        # One URL per tag: links use the case-folded Tag.name
+        return redirect(url_for('tag', name=name.casefold(), **request.args), 301)
+    tag = Tag.query.filter_by(name=name).first_or_404()
+    cursor = request.args.get('cursor')
+    query = Project.query.options(joinedload(Project.user), selectinload(Project.tag_items)).join(
+        ProjectTag, ProjectTag.project_id == Project.id
+    ).filter(ProjectTag.tag_id == tag.id, Project.is_published == True)
+    projects = paginate_keyset(query, Project.created_at, Project.id, cursor, per_page=12)
+    preload_project_stats(projects.items, current_user)
+    
+    return render_template('tag.html', tag=tag, projects=projects)
+
+def _auth_unavailable(error, template, form):
+    flash(error.message, 'warning')
+    response = make_response(render_template(template, form=form), error.status)
+    response.headers['Retry-After'] = retry_after_header(error.retry_after)
+    return response
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
     
     form = LoginForm()
-    if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
-            login_user(user, remember=form.remember_me.data)
-            next_page = request.args.get('next')
-            if not next_page or url_parse(next_page).netloc != '':
-                next_page = url_for('index')
-            return redirect(next_page)
-        flash('Nome de usuário ou senha inválidos', 'danger')
+    if request.method == 'POST':
+        try:
+            limit_attempt(request.form.get('username'))
+            if form.validate_on_submit():
+                user = User.query.filter_by(username=form.username.data).first()
+                if verify_password(user, form.password.data):
+                    login_user(user, remember=form.remember_me.data)
+                    next_page = request.args.get('next')
+                    if not next_page or url_parse(next_page).netloc != '':
+                        next_page = url_for('index')
+                    return redirect(next_page)
+                flash('Nome de usuário ou senha inválidos', 'danger')
+        except AuthUnavailable as error:
+            return _auth_unavailable(error, 'login.html', form)
     
     return render_template('login.html', form=form)
 
@@ -48,17 +137,22 @@ def register():
         return redirect(url_for('index'))
     
     form = RegistrationForm()
-    if form.validate_on_submit():
-        user = User()
-        user.username = form.username.data
-        user.email = form.email.data
-        user.first_name = form.first_name.data
-        user.last_name = form.last_name.data
-        user.set_password(form.password.data)
-        db.session.add(user)
-        db.session.commit()
-        flash('Cadastro realizado com sucesso!', 'success')
-        return redirect(url_for('login'))
+    if request.method == 'POST':
+        try:
+            limit_attempt(None)
+            if form.validate_on_submit():
+                user = User()
+                user.username = form.username.data
+                user.email = form.email.data
+                user.first_name = form.first_name.data
+                user.last_name = form.last_name.data
+                user.password_hash = hash_password(form.password.data)
+                db.session.add(user)
+                db.session.commit()
+                flash('Cadastro realizado com sucesso!', 'success')
+                return redirect(url_for('login'))
+        except AuthUnavailable as error:
+            return _auth_unavailable(error, 'register.html', form)
     
     return render_template('register.html', form=form)
 
@@ -69,17 +163,23 @@ def logout():
     return redirect(url_for('index'))
 
 @app.route('/profile/<username>')
+@cached_page()
 def profile(username):
     user = User.query.filter_by(username=username).first_or_404()
-    page = request.args.get('page', 1, type=int)
-    projects = user.projects.filter_by(is_published=True).order_by(Project.created_at.desc()).paginate(
-        page=page, per_page=9, error_out=False)
+    cursor = request.args.get('cursor')
+    query = Project.query.options(joinedload(Project.user), selectinload(Project.tag_items)).filter_by(
+        user_id=user.id, is_published=True)
+    projects = paginate_keyset(query, Project.created_at, Project.id, cursor, per_page=9)
+    
+    preload_project_stats(projects.items, current_user)
+    add_tags(f'user:{user.id}')
     
     return render_template('profile.html', user=user, projects=projects)
 
 @app.route('/edit_profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
+    fresh_user(current_user.id)  # The prefill and uniqueness checks must not see a cached identity
     form = EditProfileForm()
     if form.validate_on_submit():
         # Check if username is already taken by another user
@@ -107,10 +207,12 @@ def edit_profile():
         current_user.linkedin_profile = form.linkedin_profile.data
         
         if form.profile_image.data:
-            picture_file = save_picture(form.profile_image.data, 'profile_pics', (300, 300))
+            picture_file = save_picture(form.profile_image.data, 'profile_pics', ('avatar',))
+            replace_reference(current_user.profile_image, picture_file)
             current_user.profile_image = picture_file
         
         db.session.commit()
+        forget_identity(current_user.id)
         flash('Seu perfil foi atualizado!', 'success')
         return redirect(url_for('profile', username=current_user.username))
     
@@ -137,7 +239,7 @@ def create_project():
         project.description = form.description.data
         project.content = form.content.data
         project.category = form.category.data
-        project.tags = form.tags.data
+        set_project_tags(project, form.tags.data)
         project.github_link = form.github_link.data
         project.demo_link = form.demo_link.data
         project.is_published = form.is_published.data
@@ -146,19 +248,32 @@ def create_project():
         # Handle file uploads
         if form.image.data:
             try:
-                image_file = save_picture(form.image.data, 'projects', (800, 600))
+                image_file = save_picture(form.image.data, 'projects', ('card', 'detail'))
+                replace_reference(project.image, image_file)
                 project.image = image_file
             except Exception as e:
                 flash('Erro ao fazer upload da imagem', 'danger')
         
-        if form.video.data:
+        if form.video_upload.data:
+            video_file = claim_upload(form.video_upload.data, current_user)
+            if video_file:
+                replace_reference(project.video, video_file)
+                project.video = video_file
+            else:
+                flash('Upload do vídeo não encontrado ou incompleto', 'danger')
+        elif form.video.data:
             try:
                 video_file = save_picture(form.video.data, 'videos')
+                replace_reference(project.video, video_file)
                 project.video = video_file
             except Exception as e:
                 flash('Erro ao fazer upload do vídeo', 'danger')
         
         db.session.add(project)
+        if project.is_published:
+            adjust_counter(User, current_user.id, 'project_count', 1)
+            timeline.push_project(project)
+        index_project(project)
         db.session.commit()
         flash('Projeto criado com sucesso!', 'success')
         return redirect(url_for('project_detail', id=project.id))
@@ -166,47 +281,101 @@ def create_project():
     return render_template('create_project.html', form=form)
 
 @app.route('/project/<int:id>')
+@cached_page()
 def project_detail(id):
     project = Project.query.get_or_404(id)
     form = CommentForm()
     
-    # Get comments
-    comments = project.comments.order_by(Comment.created_at.desc()).all()
+    # One page of comments; the rest come from project_comments as the reader asks
+    comments = comment_page(project.id, request.args.get('cursor'))
     
     # Check if current user liked this project
     user_liked = False
     if current_user.is_authenticated:
         user_liked = project.is_liked_by(current_user)
+    add_tags(f'project:{project.id}', f'user:{project.user_id}', *_comment_author_tags(comments.items))
     
     return render_template('project_detail.html', project=project, form=form, 
                          comments=comments, user_liked=user_liked)
 
+def _comment_author_tags(comments):
+    threads = list(comments) + [reply for comment in comments for reply in comment.reply_preview]
+    return {f'user:{comment.user_id}' for comment in threads}
+
+_COMMENT_LIST_TEMPLATE = '''{% from "_comment.html" import render_comment with context %}
+{%- for comment in comments %}{{ render_comment(comment, project, form, is_reply=is_reply) }}{% endfor %}'''
+
+def _render_comments(project, comments, is_reply=False):
+    return render_template_string(_COMMENT_LIST_TEMPLATE, project=project, comments=comments,
+                                  form=CommentForm(), is_reply=is_reply)
+
+def _comment_json(comment):
+    return {
+        'id': comment.id,
+        'parent_id': comment.parent_id,
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
+        'reply_count': comment.reply_count,
+        'author': {'username': comment.author.username, 'display_name': comment.author.display_name},
+    }
+
+@app.route('/project/<int:project_id>/comments')
+@cached_page()
+def project_comments(project_id):
+    """JSON page of top-level comments, with their markup, for the "load more" button"""
+    project = Project.query.get_or_404(project_id)
+    comments = comment_page(project.id, request.args.get('cursor'))
+    add_tags(f'project:{project.id}', *_comment_author_tags(comments.items))
+    return jsonify({
+        'comments': [dict(_comment_json(comment), replies=[_comment_json(reply) for reply in comment.reply_preview])
+                     for comment in comments.items],
+        'html': _render_comments(project, comments.items),
+        'next_url': url_for('project_comments', project_id=project.id, cursor=comments.next_cursor)
+                    if comments.has_next else None,
+    })
+
+@app.route('/comments/<int:comment_id>/replies')
+@cached_page()
+def comment_replies(comment_id):
+    """JSON page of a thread's replies after the ?after= reply id"""
+    parent = Comment.query.get_or_404(comment_id)
+    replies, has_more = reply_page(parent.id, request.args.get('after', 0, type=int))
+    add_tags(f'project:{parent.project_id}', *_comment_author_tags(replies))
+    return jsonify({
+        'replies': [_comment_json(reply) for reply in replies],
+        'html': _render_comments(parent.project, replies, is_reply=True),
+        'next_url': url_for('comment_replies', comment_id=parent.id, after=replies[-1].id) if has_more else None,
+    })
+
 # Like/Unlike functionality
+def _like_response(result):
+    if result is None:
+        abort(404)
+    project = result.project
+    if result.changed and project.user_id != current_user.id:
+        if result.liked:
+            create_notification(project.user, 'like', f'{current_user.display_name} curtiu seu projeto "{project.title}"',
+                                related_user=current_user, project=project)
+        else:
+            retract_notification(project.user, 'like', related_user=current_user, project=project)
+    db.session.commit()
+    return jsonify({'liked': result.liked, 'like_count': result.like_count})
+
+@app.route('/project/<int:project_id>/like', methods=['PUT', 'POST', 'DELETE'])
+@login_required
+def project_like(project_id):
+    """Idempotent like API: PUT/POST likes, DELETE unlikes; repeating a request changes nothing"""
+    if request.method == 'DELETE':
+        return _like_response(unset_like(current_user, project_id))
+    return _like_response(set_like(current_user, project_id))
+
 @app.route('/toggle_like/<int:project_id>', methods=['POST'])
 @login_required
 def toggle_like(project_id):
-    project = Project.query.get_or_404(project_id)
-    existing_like = Like.query.filter_by(user_id=current_user.id, project_id=project_id).first()
-    
-    if existing_like:
-        db.session.delete(existing_like)
-        liked = False
-    else:
-        like = Like()
-        like.user_id = current_user.id
-        like.project_id = project_id
-        db.session.add(like)
-        liked = True
-        # Create notification
-        if project.user != current_user:
-            create_notification(
-                project.user, 'like', 
-                f'{current_user.display_name} curtiu seu projeto "{project.title}"',
-                related_user=current_user, project=project
-            )
-    
-    db.session.commit()
-    return jsonify({'liked': liked, 'like_count': project.get_like_count()})
+    result = unset_like(current_user, project_id)
+    if result is not None and not result.changed:
+        result = set_like(current_user, project_id)
+    return _like_response(result)
 
 # Comment functionality  
 @app.route('/add_comment/<int:project_id>', methods=['POST'])
@@ -216,11 +385,21 @@ def add_comment(project_id):
     form = CommentForm()
     
     if form.validate_on_submit():
+        parent = None
+        if form.parent_id.data:
+            parent = thread_parent(project_id, form.parent_id.data)
+            if parent is None:
+                abort(400)
+        
         comment = Comment()
         comment.content = form.content.data
         comment.user_id = current_user.id
         comment.project_id = project_id
+        comment.parent_id = parent.id if parent else None
         db.session.add(comment)
+        adjust_counter(Project, project_id, 'comment_count', 1)
+        if parent:
+            adjust_counter(Comment, parent.id, 'reply_count', 1)
         
         # Create notification
         if project.user != current_user:
@@ -229,9 +408,17 @@ def add_comment(project_id):
                 f'{current_user.display_name} comentou no seu projeto "{project.title}"',
                 related_user=current_user, project=project
             )
+        if parent and parent.author != current_user and parent.author != project.user:
+            create_notification(
+                parent.author, 'comment',
+                f'{current_user.display_name} respondeu seu comentário em "{project.title}"',
+                related_user=current_user, project=project
+            )
         
         db.session.commit()
         flash('Comentário adicionado!', 'success')
+        if parent:
+            return redirect(url_for('project_detail', id=project_id, _anchor=f'comment-{parent.id}'))
     
     return redirect(url_for('project_detail', id=project_id))
 
@@ -244,15 +431,16 @@ def follow(username):
         flash('Você não pode seguir a si mesmo!', 'warning')
         return redirect(url_for('profile', username=username))
     
-    current_user.follow(user)
+    if current_user.follow(user):
+        timeline.add_author(current_user, user)
+        # Before the commit, which writes it (or hands it to the queue) with the follow
+        create_notification(
+            user, 'follow',
+            f'{current_user.display_name} começou a seguir você',
+            related_user=current_user
+        )
     db.session.commit()
-    
-    # Create notification
-    create_notification(
-        user, 'follow',
-        f'{current_user.display_name} começou a seguir você',
-        related_user=current_user
-    )
+    get_graph().sync(force=True)  # Our own next page must already show the follow
     
     flash(f'Agora você está seguindo {user.display_name}!', 'success')
     return redirect(url_for('profile', username=username))
@@ -265,8 +453,10 @@ def unfollow(username):
         flash('Você não pode deixar de seguir a si mesmo!', 'warning')
         return redirect(url_for('profile', username=username))
     
-    current_user.unfollow(user)
+    if current_user.unfollow(user):
+        timeline.remove_author(current_user, user)
     db.session.commit()
+    get_graph().sync(force=True)
     flash(f'Você não está mais seguindo {user.display_name}.', 'info')
     return redirect(url_for('profile', username=username))
 
@@ -274,61 +464,129 @@ def unfollow(username):
 @app.route('/notifications')
 @login_required
 def notifications():
-    page = request.args.get('page', 1, type=int)
-    notifications = current_user.notifications.order_by(Notification.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False)
-    
-    # Mark all as read
-    current_user.notifications.filter_by(read=False).update({Notification.read: True})
+    # Mark all as read first, so the commit does not expire the page below;
+    # the previous watermark still highlights what was new
+    read_at, marked = mark_all_read(current_user.id)
     db.session.commit()
+    if marked:
+        forget_identity(current_user.id)
+        get_broker().publish(current_user.id, {'unread': 0})
+    
+    cursor = request.args.get('cursor')
+    query = current_user.notifications.options(joinedload(Notification.related_user), joinedload(Notification.project))
+    notifications = paginate_keyset(query, Notification.created_at, Notification.id, cursor, per_page=20)
     
-    return render_template('notifications.html', notifications=notifications)
+    return render_template('notifications.html', notifications=notifications, read_at=read_at)
+
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+@app.route('/notifications/stream')
+@login_required
+def notification_stream():
+    """Server-Sent Events stream of the unread notification count"""
+    global _open_streams
+    user_id = current_user.id
+    unread = current_user.get_unread_notification_count()
+    timeout = app.config['NOTIFICATION_STREAM_TIMEOUT']
+    heartbeat = app.config['NOTIFICATION_STREAM_HEARTBEAT']
+    broker = get_broker()
+    # Don't hold a pooled connection for the lifetime of the stream
+    db.session.close()
+    # Each stream holds a worker thread; past the cap answer 204, which tells
+    # EventSource to stop reconnecting (the badge then updates on page loads)
+    with _open_streams_lock:
+        if _open_streams >= app.config['NOTIFICATION_STREAM_MAX']:
+            return '', 204
+        _open_streams += 1
+    
+    def generate():
+        with broker.subscribe(user_id) as subscription:
+            yield f'retry: 5000\ndata: {json.dumps({"unread": unread})}\n\n'
+            # Close periodically; EventSource reconnects and the worker is freed up
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                payload = subscription.get(timeout=heartbeat)
+                if payload is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield f'data: {json.dumps(payload)}\n\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(_close_stream)
+    return response
+
+def _close_stream():
+    global _open_streams
+    with _open_streams_lock:
+        _open_streams -= 1
 
 # Feed
 @app.route('/feed')
 @login_required  
 def feed():
-    page = request.args.get('page', 1, type=int)
-    
-    # Get projects from followed users using the follows table directly
-    followed_projects = Project.query.join(
-        follows, (follows.c.followed_id == Project.user_id)
-    ).filter(
-        follows.c.follower_id == current_user.id,
-        Project.is_published == True
-    ).order_by(Project.created_at.desc())
+    cursor = request.args.get('cursor')
     
-    # Include current user's projects
-    own_projects = Project.query.filter_by(user_id=current_user.id, is_published=True)
+    # Projects from followed users plus the current user's own, from the materialized timeline
+    all_projects = timeline.timeline_page(current_user, cursor, per_page=10)
     
-    # Combine and paginate
-    all_projects = followed_projects.union(own_projects).order_by(Project.created_at.desc()).paginate(
-        page=page, per_page=10, error_out=False)
+    preload_project_stats(all_projects.items, current_user)
+    suggestions = [] if cursor else _who_to_follow(current_user, limit=5)
     
-    return render_template('feed.html', projects=all_projects)
+    return render_template('feed.html', projects=all_projects, suggestions=suggestions)
+
+def _who_to_follow(user, limit):
+    """[(User, mutual follow count)] from the follow graph, in ranking order"""
+    ranked = get_graph().suggestions(user.id, limit)
+    users = {u.id: u for u in User.query.filter(User.id.in_([user_id for user_id, _ in ranked]))}
+    return [(users[user_id], mutual) for user_id, mutual in ranked if user_id in users]
+
+@app.route('/who_to_follow')
+@login_required
+def who_to_follow():
+    """Friends-of-friends suggestions ranked by mutual follows (JSON)"""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify({'suggestions': [{
+        'username': user.username,
+        'display_name': user.display_name,
+        'mutual': mutual,
+        'url': url_for('profile', username=user.username),
+        'follow_url': url_for('follow', username=user.username),
+    } for user, mutual in _who_to_follow(current_user, limit)]})
 
 # Followers/Following pages
+def _followed_ids(users):
+    """Which of these users the viewer follows, answered for the whole page at once"""
+    if not current_user.is_authenticated:
+        return set()
+    return get_graph().following_among(current_user.id, [user.id for user in users])
+
 @app.route('/followers/<username>')
+@cached_page()
 def followers(username):
     user = User.query.filter_by(username=username).first_or_404()
-    page = request.args.get('page', 1, type=int)
-    followers = User.query.join(
+    cursor = request.args.get('cursor')
+    followers = paginate_keyset(User.query.join(
         follows, (follows.c.follower_id == User.id)
-    ).filter(follows.c.followed_id == user.id).paginate(
-        page=page, per_page=20, error_out=False)
+    ).filter(follows.c.followed_id == user.id), User.created_at, User.id, cursor, per_page=20)
     
-    return render_template('followers.html', user=user, users=followers)
+    add_tags(f'user:{user.id}')
+    followed_ids = _followed_ids(followers.items)
+    return render_template('followers.html', user=user, followers_users=followers, followed_ids=followed_ids)
 
 @app.route('/following/<username>')  
+@cached_page()
 def following(username):
     user = User.query.filter_by(username=username).first_or_404()
-    page = request.args.get('page', 1, type=int)
-    following = User.query.join(
+    cursor = request.args.get('cursor')
+    following = paginate_keyset(User.query.join(
         follows, (follows.c.followed_id == User.id)
-    ).filter(follows.c.follower_id == user.id).paginate(
-        page=page, per_page=20, error_out=False)
+    ).filter(follows.c.follower_id == user.id), User.created_at, User.id, cursor, per_page=20)
     
-    return render_template('following.html', user=user, users=following)
+    add_tags(f'user:{user.id}')
+    followed_ids = _followed_ids(following.items)
+    return render_template('following.html', user=user, following_users=following, followed_ids=followed_ids)
 
 # Project editing and deletion routes
 @app.route('/project/<int:id>/edit', methods=['GET', 'POST'])
@@ -341,29 +599,47 @@ def edit_project(id):
     
     form = ProjectForm()
     if form.validate_on_submit():
+        was_published = project.is_published
         project.title = form.title.data
         project.description = form.description.data
         project.content = form.content.data
         project.category = form.category.data
-        project.tags = form.tags.data
+        set_project_tags(project, form.tags.data)
         project.github_link = form.github_link.data
         project.demo_link = form.demo_link.data
         project.is_published = form.is_published.data
         
         if form.image.data:
             try:
-                image_file = save_picture(form.image.data, 'projects', (800, 600))
+                image_file = save_picture(form.image.data, 'projects', ('card', 'detail'))
+                replace_reference(project.image, image_file)
                 project.image = image_file
             except Exception as e:
                 flash('Erro ao fazer upload da imagem', 'danger')
         
-        if form.video.data:
+        if form.video_upload.data:
+            video_file = claim_upload(form.video_upload.data, current_user)
+            if video_file:
+                replace_reference(project.video, video_file)
+                project.video = video_file
+            else:
+                flash('Upload do vídeo não encontrado ou incompleto', 'danger')
+        elif form.video.data:
             try:
                 video_file = save_picture(form.video.data, 'videos')
+                replace_reference(project.video, video_file)
                 project.video = video_file
             except Exception as e:
                 flash('Erro ao fazer upload do vídeo', 'danger')
         
+        if project.is_published != was_published:
+            adjust_counter(User, current_user.id, 'project_count', 1 if project.is_published else -1)
+            if project.is_published:
+                timeline.push_project(project)
+            else:
+                timeline.remove_project(project)
+        index_project(project)
+        
         db.session.commit()
         flash('Projeto atualizado com sucesso!', 'success')
         return redirect(url_for('project_detail', id=project.id))
@@ -388,11 +664,70 @@ def delete_project(id):
     if project.user != current_user:
         abort(403)
     
+    if project.is_published:
+        adjust_counter(User, current_user.id, 'project_count', -1)
+    timeline.remove_project(project)
+    unindex_project(project)
+    replace_reference(project.image, None)
+    replace_reference(project.video, None)
     db.session.delete(project)
     db.session.commit()
     flash('Projeto excluído com sucesso!', 'success')
     return redirect(url_for('profile', username=current_user.username))
 
+# Chunked, resumable video uploads
+def _video_upload_state(upload):
+    return {
+        'id': upload.id,
+        'offset': current_offset(upload),
+        'size': upload.size,
+        'complete': upload.is_complete,
+        'chunk_size': app.config['VIDEO_CHUNK_SIZE'],
+        'url': url_for('video_upload', upload_id=upload.id),
+    }
+
+def _get_own_upload(upload_id):
+    upload = VideoUpload.query.get_or_404(upload_id)
+    if upload.user_id != current_user.id:
+        abort(403)
+    return upload
+
+@app.errorhandler(UploadError)
+def upload_error(error):
+    return jsonify({'error': error.message}), error.status
+
+@app.route('/video_uploads', methods=['POST'])
+@login_required
+def start_video_upload():
+    """Open an upload session: {"filename", "size", "checksum" (optional SHA-256 hex)}"""
+    data = request.get_json(silent=True) or {}
+    upload = start_upload(current_user, data.get('filename'), data.get('size'), data.get('checksum'))
+    return jsonify(_video_upload_state(upload)), 201
+
+@app.route('/video_uploads/<upload_id>', methods=['GET', 'PATCH', 'DELETE'])
+@login_required
+def video_upload(upload_id):
+    """GET reports the offset to resume from; PATCH appends the raw request body
+    at the Upload-Offset header; DELETE aborts the upload."""
+    upload = _get_own_upload(upload_id)
+    
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            raise UploadError('Cabeçalho Upload-Offset ausente')
+        # Read request.stream directly so the chunk is never buffered in memory
+        append_chunk(upload, offset, request.stream, request.content_length,
+                     request.headers.get('Upload-Checksum'))
+    elif request.method == 'DELETE':
+        discard_upload(upload)
+        return '', 204
+    
+    response = jsonify(_video_upload_state(upload))
+    response.headers['Upload-Offset'] = str(current_offset(upload))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 # Configure upload folder
 app.config['UPLOAD_FOLDER'] = os.path.join(os.getcwd(), 'uploads')
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
@@ -0,0 +1,185 @@
+import math
+import re
+import unicodedata
+from sqlalchemy.orm import joinedload, selectinload
+from models import Project, SearchDocument, SearchPosting, SearchTerm, PROJECT_SEARCH_VECTOR, db
+
+# Field weights for the portable index, mirroring the A/B/C weights of the PostgreSQL vector
+FIELD_WEIGHTS = (('title', 3.0), ('tags', 3.0), ('description', 2.0), ('content', 1.0))
+
+# BM25 tuning
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Autocomplete matches the last word against at most this many indexed
+# terms, the ones found in the most projects
+PREFIX_TERMS = 20
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+def _use_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+def tokenize(text, fold_accents=True):
+    """Lowercase word tokens, optionally with accents stripped"""
+    text = (text or '').lower()
+    if fold_accents:
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return [token[:64] for token in _TOKEN_RE.findall(text)]
+
+def index_project(project):
+    """(Re)build the portable index entries for a project.
+
+    A no-op on PostgreSQL, where the GIN expression index is maintained by
+    the database itself.
+    """
+    if _use_postgres():
+        return
+    db.session.flush()
+    unindex_project(project)
+    
+    frequencies, length = {}, 0.0
+    for field, weight in FIELD_WEIGHTS:
+        for token in tokenize(getattr(project, field)):
+            frequencies[token] = frequencies.get(token, 0.0) + weight
+            length += weight
+    
+    db.session.add(SearchDocument(project_id=project.id, length=int(length)))
+    if frequencies:
+        db.session.execute(db.insert(SearchPosting), [
+            {'term': term, 'project_id': project.id, 'frequency': frequency}
+            for term, frequency in frequencies.items()
+        ])
+        _count_documents(list(frequencies), 1)
+
+def unindex_project(project):
+    """Remove a project from the portable index (no-op on PostgreSQL)"""
+    if _use_postgres():
+        return
+    terms = db.session.scalars(db.select(SearchPosting.term).where(SearchPosting.project_id == project.id)).all()
+    _count_documents(terms, -1)
+    db.session.execute(db.delete(SearchPosting).where(SearchPosting.project_id == project.id))
+    db.session.execute(db.delete(SearchDocument).where(SearchDocument.project_id == project.id))
+
+def _count_documents(terms, delta):
+    """Add delta to the document frequency of each term"""
+    if not terms:
+        return
+    db.session.execute(db.update(SearchTerm).where(SearchTerm.term.in_(terms)).values(
+        document_count=SearchTerm.document_count + delta))
+    if delta > 0:
+        # The UPDATE above already holds SQLite's write lock, so nobody adds these meanwhile
+        known = set(db.session.scalars(db.select(SearchTerm.term).where(SearchTerm.term.in_(terms))))
+        missing = [{'term': term, 'document_count': delta} for term in terms if term not in known]
+        if missing:
+            db.session.execute(db.insert(SearchTerm), missing)
+    else:
+        db.session.execute(db.delete(SearchTerm).where(SearchTerm.term.in_(terms), SearchTerm.document_count <= 0))
+
+def reindex_all(batch_size=500):
+    """Rebuild the portable index; on PostgreSQL the GIN index needs no rebuilding"""
+    if _use_postgres():
+        return
+    db.session.execute(db.delete(SearchPosting))
+    db.session.execute(db.delete(SearchDocument))
+    db.session.execute(db.delete(SearchTerm))
+    last_id = 0
+    while True:
+        batch = Project.query.filter(Project.id > last_id).order_by(Project.id).limit(batch_size).all()
+        if not batch:
+            break
+        for project in batch:
+            index_project(project)
+        last_id = batch[-1].id
+        db.session.commit()
+    db.session.commit()  # The deletes, when there were no projects to index
+
+def _postgres_search(tokens, category, prefix, limit, offset):
+    """Rank with ts_rank_cd over the GIN-indexed weighted vector"""
+    terms = [f"'{token}'" for token in tokens]
+    if prefix:
+        terms[-1] += ':*'
+    vector = db.literal_column(f'({PROJECT_SEARCH_VECTOR})')
+    tsquery = db.func.to_tsquery('simple', ' & '.join(terms))
+    # Normalization 32 scales rank into [0, 1) so long documents don't dominate
+    rank = db.func.ts_rank_cd(vector, tsquery, 32)
+    
+    query = Project.query.options(joinedload(Project.user), selectinload(Project.tag_items)).filter(
+        Project.is_published == True, vector.op('@@')(tsquery))
+    if category:
+        query = query.filter(Project.category == category)
+    return query.order_by(rank.desc(), Project.id.desc()).offset(offset).limit(limit).all()
+
+def _portable_search(tokens, category, prefix, limit, offset):
+    """BM25 over the SearchPosting inverted index, scored in Python"""
+    exact_terms = set(tokens[:-1] if prefix else tokens)
+    expansions = set()
+    if prefix:
+        # Range scan on the term primary key instead of LIKE, keeping the most common completions
+        expansions = set(db.session.scalars(db.select(SearchTerm.term).where(
+            SearchTerm.term >= tokens[-1], SearchTerm.term < tokens[-1] + '\uffff'
+        ).order_by(SearchTerm.document_count.desc(), SearchTerm.term).limit(PREFIX_TERMS)))
+        if not expansions:
+            return []
+    terms = exact_terms | expansions
+    
+    doc_count, avg_length = db.session.query(
+        db.func.count(SearchDocument.project_id), db.func.avg(SearchDocument.length)).one()
+    if not doc_count:
+        return []
+    avg_length = float(avg_length or 1) or 1.0
+    # Corpus-wide document frequencies, whatever the category or publication filter
+    document_frequency = dict(db.session.query(SearchTerm.term, SearchTerm.document_count).filter(
+        SearchTerm.term.in_(terms)))
+    
+    postings = db.session.query(
+        SearchPosting.term, SearchPosting.project_id, SearchPosting.frequency, SearchDocument.length
+    ).join(
+        SearchDocument, SearchDocument.project_id == SearchPosting.project_id
+    ).join(
+        Project, Project.id == SearchPosting.project_id
+    ).filter(SearchPosting.term.in_(terms), Project.is_published == True)
+    if category:
+        postings = postings.filter(Project.category == category)
+    postings = postings.all()
+    
+    scores, matched = {}, {}
+    for term, project_id, frequency, length in postings:
+        df = document_frequency.get(term, 1)
+        idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+        scores[project_id] = scores.get(project_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        # Track which query tokens each document satisfied (AND semantics)
+        query_token = term if term in exact_terms else tokens[-1]
+        matched.setdefault(project_id, set()).add(query_token)
+    
+    required = len(set(tokens))
+    ranked = sorted((project_id for project_id in scores if len(matched[project_id]) == required),
+                    key=lambda project_id: (-scores[project_id], -project_id))
+    ids = ranked[offset:offset + limit]
+    if not ids:
+        return []
+    projects = {project.id: project for project in
+                Project.query.options(joinedload(Project.user), selectinload(Project.tag_items)).filter(Project.id.in_(ids))}
+    return [projects[project_id] for project_id in ids if project_id in projects]
+
+def search_projects(text, category=None, page=1, per_page=12, prefix=False):
+    """Ranked published projects matching every word of text.
+
+    Returns (projects, has_next). With prefix=True the last word matches as
+    a prefix, which is what autocomplete uses.
+    """
+    use_postgres = _use_postgres()
+    tokens = tokenize(text, fold_accents=not use_postgres)
+    if not tokens:
+        return [], False
+    
+    offset = (max(page, 1) - 1) * per_page
+    backend = _postgres_search if use_postgres else _portable_search
+    results = backend(tokens, category, prefix, per_page + 1, offset)
+    return results[:per_page], len(results) > per_page
+
+def suggest_projects(text, limit=8):
+    """Prefix autocomplete: top project matches for a partially typed query"""
+    projects, _ = search_projects(text, per_page=limit, prefix=True)
+    return projects
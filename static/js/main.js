@@ -34,6 +34,51 @@ document.addEventListener('DOMContentLoaded', function() {
         
         searchInput.addEventListener('blur', function() {
             this.parentElement.style.transform = 'scale(1)';
+            // Delay so a click on a suggestion still registers
+            setTimeout(() => hideSuggestions(), 150);
+        });
+        
+        // Prefix autocomplete
+        let suggestTimer = null;
+        let suggestMenu = null;
+        
+        function hideSuggestions() {
+            if (suggestMenu) {
+                suggestMenu.remove();
+                suggestMenu = null;
+            }
+        }
+        
+        searchInput.addEventListener('input', function() {
+            const query = this.value.trim();
+            clearTimeout(suggestTimer);
+            if (query.length < 2) {
+                hideSuggestions();
+                return;
+            }
+            
+            suggestTimer = setTimeout(() => {
+                fetch(`${this.dataset.suggestUrl}?q=${encodeURIComponent(query)}`)
+                .then(response => response.json())
+                .then(data => {
+                    hideSuggestions();
+                    if (!data.suggestions.length) {
+                        return;
+                    }
+                    
+                    suggestMenu = document.createElement('div');
+                    suggestMenu.className = 'dropdown-menu show search-suggestions';
+                    data.suggestions.forEach(item => {
+                        const link = document.createElement('a');
+                        link.className = 'dropdown-item';
+                        link.href = item.url;
+                        link.textContent = item.title;
+                        suggestMenu.appendChild(link);
+                    });
+                    this.closest('.search-container').appendChild(suggestMenu);
+                })
+                .catch(error => console.error('Error:', error));
+            }, 150);
         });
     }
     
@@ -53,6 +98,10 @@ document.addEventListener('DOMContentLoaded', function() {
     function setupLikeButtons() {
         const likeButtons = document.querySelectorAll('.like-btn');
         likeButtons.forEach(btn => {
+            // Called again for dynamically added content; bind each button once
+            if (btn.dataset.likeBound) return;
+            btn.dataset.likeBound = 'true';
+            
             btn.addEventListener('click', function(e) {
                 e.preventDefault();
                 
@@ -60,24 +109,35 @@ document.addEventListener('DOMContentLoaded', function() {
                 const heartIcon = this.querySelector('i');
                 const countSpan = this.querySelector('.like-count');
                 
+                // Ask for the state we want rather than a toggle, so a
+                // double click or a retried request cannot flip it back
+                const wantLiked = this.dataset.liked !== 'true';
+                
                 // Add loading state
                 heartIcon.classList.add('fa-spin');
                 
                 fetch(`/project/${projectId}/like`, {
-                    method: 'POST',
+                    method: wantLiked ? 'PUT' : 'DELETE',
                     headers: {
                         'Content-Type': 'application/json',
                         'X-CSRFToken': getCSRFToken()
                     }
                 })
-                .then(response => response.json())
+                .then(response => {
+                    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                    return response.json();
+                })
                 .then(data => {
                     heartIcon.classList.remove('fa-spin');
+                    this.dataset.liked = data.liked.toString();
                     
                     if (data.liked) {
-                        heartIcon.classList.remove('far');
-                        heartIcon.classList.add('fas');
+                        heartIcon.classList.remove('far', 'fa-heart-o', 'text-muted');
+                        heartIcon.classList.add('fas', 'fa-heart', 'text-danger');
                         this.classList.add('liked');
+                        if (this.classList.contains('btn-outline-danger')) {
+                            this.classList.replace('btn-outline-danger', 'btn-danger');
+                        }
                         
                         // Heart animation
                         heartIcon.style.transform = 'scale(1.3)';
@@ -85,9 +145,12 @@ document.addEventListener('DOMContentLoaded', function() {
                             heartIcon.style.transform = 'scale(1)';
                         }, 200);
                     } else {
-                        heartIcon.classList.remove('fas');
-                        heartIcon.classList.add('far');
+                        heartIcon.classList.remove('fas', 'text-danger');
+                        heartIcon.classList.add('far', 'fa-heart', 'text-muted');
                         this.classList.remove('liked');
+                        if (this.classList.contains('btn-danger')) {
+                            this.classList.replace('btn-danger', 'btn-outline-danger');
+                        }
                     }
                     
                     countSpan.textContent = data.like_count;
@@ -107,6 +170,65 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Comment threads: load more comments/replies and inline reply forms.
+    // Delegated, so comments appended later work without rebinding.
+    function setupCommentThreads() {
+        function loadInto(button, url, target, nextAttr) {
+            if (button.classList.contains('disabled')) return;
+            button.disabled = true;
+            button.classList.add('disabled');
+            fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(response => {
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                return response.json();
+            })
+            .then(data => {
+                target.insertAdjacentHTML('beforeend', data.html);
+                if (data.next_url) {
+                    button.dataset[nextAttr] = data.next_url;
+                    button.disabled = false;
+                    button.classList.remove('disabled');
+                } else {
+                    button.remove();
+                }
+            })
+            .catch(error => {
+                button.disabled = false;
+                button.classList.remove('disabled');
+                console.error('Error:', error);
+                showNotification('Erro ao carregar comentários', 'error');
+            });
+        }
+        
+        document.addEventListener('click', function(e) {
+            const moreComments = e.target.closest('.load-comments');
+            if (moreComments) {
+                e.preventDefault();
+                loadInto(moreComments, moreComments.dataset.commentsUrl,
+                         document.getElementById('comment-items'), 'commentsUrl');
+                return;
+            }
+            
+            const moreReplies = e.target.closest('.load-replies');
+            if (moreReplies) {
+                e.preventDefault();
+                loadInto(moreReplies, moreReplies.dataset.repliesUrl,
+                         document.getElementById(moreReplies.dataset.repliesTarget), 'repliesUrl');
+                return;
+            }
+            
+            const replyToggle = e.target.closest('.reply-toggle');
+            if (replyToggle) {
+                e.preventDefault();
+                const form = document.getElementById(replyToggle.dataset.replyForm);
+                form.classList.toggle('d-none');
+                if (!form.classList.contains('d-none')) {
+                    form.querySelector('textarea').focus();
+                }
+            }
+        });
+    }
+    
     // Follow Button Enhancement
     function setupFollowButtons() {
         const followButtons = document.querySelectorAll('.follow-btn');
@@ -153,6 +275,180 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Live unread-notification badge over Server-Sent Events
+    function setupNotificationStream() {
+        const badge = document.getElementById('notification-badge');
+        const link = badge && badge.closest('[data-stream-url]');
+        if (!link || !('EventSource' in window)) {
+            return;
+        }
+        
+        const source = new EventSource(link.dataset.streamUrl);
+        source.onmessage = function(event) {
+            const data = JSON.parse(event.data);
+            badge.textContent = data.unread;
+            badge.classList.toggle('d-none', data.unread === 0);
+        };
+    }
+    
+    // Chunked, resumable video uploads
+    function setupChunkedUploads() {
+        document.querySelectorAll('input[type="file"][data-chunked-upload]').forEach(input => {
+            const form = input.closest('form');
+            const field = document.getElementById(input.dataset.uploadField);
+            const progress = document.querySelector(`[data-upload-progress-for="${input.id}"]`);
+            const bar = progress && progress.querySelector('.progress-bar');
+            let uploading = false;
+
+            function setProgress(done, total) {
+                if (!bar) return;
+                progress.classList.remove('d-none');
+                bar.style.width = `${Math.round(done / total * 100)}%`;
+            }
+
+            async function chunkChecksum(blob) {
+                if (!(window.crypto && crypto.subtle)) return null;
+                const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+                return 'sha256 ' + btoa(String.fromCharCode(...new Uint8Array(digest)));
+            }
+
+            async function sendChunks(file, state) {
+                let offset = state.offset;
+                let failures = 0;
+                while (offset < file.size) {
+                    const chunk = file.slice(offset, offset + state.chunk_size);
+                    const headers = {
+                        'Upload-Offset': offset,
+                        'Content-Type': 'application/offset+octet-stream',
+                        'X-CSRFToken': getCSRFToken()
+                    };
+                    const checksum = await chunkChecksum(chunk);
+                    if (checksum) headers['Upload-Checksum'] = checksum;
+                    try {
+                        const response = await fetch(state.url, { method: 'PATCH', headers: headers, body: chunk });
+                        if (!response.ok && response.status !== 409 && response.status !== 460) {
+                            throw new Error((await response.json()).error);
+                        }
+                        if (!response.ok) {
+                            // Offset drifted or chunk corrupted in transit: ask where to resume
+                            offset = (await (await fetch(state.url)).json()).offset;
+                        } else {
+                            offset = (await response.json()).offset;
+                            failures = 0;
+                        }
+                    } catch (error) {
+                        if (error instanceof TypeError && ++failures <= 5) {
+                            // Network hiccup: back off, then resume from the server's offset
+                            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+                            offset = (await (await fetch(state.url)).json()).offset;
+                            continue;
+                        }
+                        throw error;
+                    }
+                    setProgress(offset, file.size);
+                }
+            }
+
+            input.addEventListener('change', async function() {
+                const file = input.files[0];
+                if (!file || !field) return;
+
+                uploading = true;
+                field.value = '';
+                setProgress(0, file.size);
+                try {
+                    const response = await fetch(input.dataset.chunkedUpload, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json', 'X-CSRFToken': getCSRFToken() },
+                        body: JSON.stringify({ filename: file.name, size: file.size })
+                    });
+                    const state = await response.json();
+                    if (!response.ok) throw new Error(state.error);
+
+                    await sendChunks(file, state);
+                    field.value = state.id;
+                    // The file is already on the server; don't post it again with the form
+                    input.value = '';
+                    showNotification('Vídeo enviado com sucesso!', 'success');
+                } catch (error) {
+                    showNotification(error.message || 'Erro ao enviar o vídeo', 'danger');
+                } finally {
+                    uploading = false;
+                }
+            });
+
+            if (form) {
+                form.addEventListener('submit', function(event) {
+                    if (uploading) {
+                        event.preventDefault();
+                        showNotification('Aguarde o envio do vídeo terminar', 'warning');
+                    }
+                });
+            }
+        });
+    }
+
+    // Infinite Scroll for cursor-paginated lists
+    function setupInfiniteScroll() {
+        if (!('IntersectionObserver' in window)) {
+            return;
+        }
+        
+        document.querySelectorAll('[data-infinite-scroll]').forEach(container => {
+            let loading = false;
+            
+            const observer = new IntersectionObserver(entries => {
+                if (!entries.some(entry => entry.isIntersecting) || loading) {
+                    return;
+                }
+                
+                const nav = document.querySelector(`[data-pagination-for="${container.id}"]`);
+                const nextLink = nav && nav.querySelector('a[rel="next"]');
+                if (!nextLink) {
+                    observer.disconnect();
+                    return;
+                }
+                
+                loading = true;
+                fetch(nextLink.href, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(response => response.text())
+                .then(html => {
+                    const doc = new DOMParser().parseFromString(html, 'text/html');
+                    const nextContainer = doc.getElementById(container.id);
+                    const nextNav = doc.querySelector(`[data-pagination-for="${container.id}"]`);
+                    
+                    if (nextContainer) {
+                        Array.from(nextContainer.children).forEach(child => container.appendChild(child));
+                    }
+                    
+                    observer.unobserve(nav);
+                    if (nextNav) {
+                        // Only keep the "next" cursor; earlier pages are already on screen
+                        const prevItem = nextNav.querySelector('a[rel="prev"]');
+                        if (prevItem) {
+                            prevItem.closest('.page-item').remove();
+                        }
+                        nav.replaceWith(nextNav);
+                        observer.observe(nextNav);
+                    } else {
+                        nav.remove();
+                        observer.disconnect();
+                    }
+                    loading = false;
+                })
+                .catch(error => {
+                    loading = false;
+                    console.error('Error:', error);
+                });
+            }, { rootMargin: '400px 0px' });
+            
+            const nav = document.querySelector(`[data-pagination-for="${container.id}"]`);
+            if (nav) {
+                observer.observe(nav);
+            }
+        });
+    }
+    
     // Enhanced Image Preview
     function setupImagePreviews() {
         const imageInputs = document.querySelectorAll('input[type="file"][accept*="image"]');
@@ -344,6 +640,10 @@ document.addEventListener('DOMContentLoaded', function() {
     setupFollowButtons();
     setupImagePreviews();
     setupFormValidation();
+    setupInfiniteScroll();
+    setupCommentThreads();
+    setupChunkedUploads();
+    setupNotificationStream();
     
     // Progressive Enhancement for dynamic content
     const observer = new MutationObserver(function(mutations) {
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from models import Project, Tag, ProjectTag, db
+
+MAX_TAG_LENGTH = 64
+
+def parse_tags(text):
+    """Split a comma-separated string into unique (name, label) pairs, in order"""
+    seen, parsed = set(), []
+    for raw in (text or '').split(','):
+        label = raw.strip()[:MAX_TAG_LENGTH]
+        name = label.casefold()
+        if name and name not in seen:
+            seen.add(name)
+            parsed.append((name, label))
+    return parsed
+
+def _get_or_create_tags(parsed):
+    """Map tag names to Tag rows, inserting missing ones"""
+    names = [name for name, _ in parsed]
+    tags = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(names))} if names else {}
+    for name, label in parsed:
+        if name in tags:
+            continue
+        try:
+            with db.session.begin_nested():
+                tag = Tag(name=name, label=label)
+                db.session.add(tag)
+        except IntegrityError:
+            # Another request created it first
+            tag = Tag.query.filter_by(name=name).one()
+        tags[name] = tag
+    return tags
+
+def set_project_tags(project, text):
+    """Replace a project's tags with those in a comma-separated string"""
+    parsed = parse_tags(text)
+    tags = _get_or_create_tags(parsed)
+    
+    # Reuse existing links so an unchanged tag isn't deleted and re-inserted
+    current = {link.tag_id: link for link in project.tag_links}
+    links = []
+    for position, (name, _) in enumerate(parsed):
+        tag = tags[name]
+        link = current.get(tag.id) or ProjectTag(tag=tag)
+        link.position = position
+        links.append(link)
+    project.tag_links = links
+    project.tags = ', '.join(label for _, label in parsed)
+
+def backfill_tags(batch_size=500):
+    """Populate Tag/ProjectTag from the legacy comma-separated Project.tags strings"""
+    last_id = 0
+    while True:
+        batch = Project.query.filter(Project.id > last_id).order_by(Project.id).limit(batch_size).all()
+        if not batch:
+            break
+        for project in batch:
+            set_project_tags(project, project.tags)
+        last_id = batch[-1].id
+        db.session.commit()
+
+def trending_tags(limit=10, days=30):
+    """Most used tags on projects published in the last days, as (Tag, count) pairs"""
+    since = datetime.utcnow() - timedelta(days=days)
+    uses = db.func.count(ProjectTag.project_id).label('uses')
+    return db.session.query(Tag, uses).join(
+        ProjectTag, ProjectTag.tag_id == Tag.id
+    ).join(
+        Project, Project.id == ProjectTag.project_id
+    ).filter(
+        Project.is_published == True,
+        Project.created_at >= since
+    ).group_by(Tag.id).order_by(uses.desc(), Tag.name).limit(limit).all()
@@ -0,0 +1,122 @@
+from flask import current_app
+from sqlalchemy.orm import joinedload, selectinload
+from models import User, Project, TimelineEntry, follows, db
+from pagination import paginate_keyset
+
+def _is_fanout_author(user):
+    """Authors with huge audiences skip fan-out; their followers read them directly"""
+    return user.follower_count <= current_app.config['TIMELINE_FANOUT_LIMIT']
+
+def push_project(project):
+    """Fan a newly published project out to the author's and followers' timelines, keeping each within the cap"""
+    db.session.flush()
+    db.session.add(TimelineEntry(user_id=project.user_id, project_id=project.id, created_at=project.created_at))
+    
+    if _is_fanout_author(project.user):
+        db.session.execute(db.insert(TimelineEntry).from_select(
+            ['user_id', 'project_id', 'created_at'],
+            db.select(follows.c.follower_id, db.literal(project.id), db.literal(project.created_at))
+            .where(follows.c.followed_id == project.user_id)
+        ))
+        # Everyone who just got an entry may now be one over the cap
+        _trim(db.select(follows.c.follower_id).where(follows.c.followed_id == project.user_id)
+              .union(db.select(db.literal(project.user_id))))
+    else:
+        _trim([project.user_id])
+
+def remove_project(project):
+    """Drop a project from every timeline (on delete or unpublish)"""
+    db.session.execute(db.delete(TimelineEntry).where(TimelineEntry.project_id == project.id))
+
+def add_author(user, author):
+    """Backfill author's recent projects into user's timeline after a follow"""
+    if author.id != user.id and not _is_fanout_author(author):
+        return
+    already = db.select(TimelineEntry.project_id).where(TimelineEntry.user_id == user.id)
+    recent = db.select(db.literal(user.id), Project.id, Project.created_at).where(
+        Project.user_id == author.id,
+        Project.is_published == True,
+        Project.id.not_in(already)
+    ).order_by(Project.created_at.desc()).limit(current_app.config['TIMELINE_MAX_ENTRIES'])
+    db.session.execute(db.insert(TimelineEntry).from_select(['user_id', 'project_id', 'created_at'], recent))
+    _trim([user.id])
+
+def remove_author(user, author):
+    """Prune author's projects from user's timeline after an unfollow"""
+    authored = db.select(Project.id).where(Project.user_id == author.id)
+    db.session.execute(db.delete(TimelineEntry).where(
+        TimelineEntry.user_id == user.id,
+        TimelineEntry.project_id.in_(authored)
+    ))
+
+def timeline_page(user, cursor=None, per_page=10):
+    """One page of user's home feed, newest first.
+
+    Normally a single range read over (user_id, created_at) on the
+    materialized timeline. If the user follows authors that are above the
+    fan-out limit, their projects are merged in at read time.
+    """
+    skipped_authors = [user_id for (user_id,) in db.session.query(follows.c.followed_id).join(
+        User, User.id == follows.c.followed_id
+    ).filter(
+        follows.c.follower_id == user.id,
+        User.follower_count > current_app.config['TIMELINE_FANOUT_LIMIT']
+    )]
+    
+    if not skipped_authors:
+        query = Project.query.options(joinedload(Project.user), selectinload(Project.tag_items)).join(
+            TimelineEntry, TimelineEntry.project_id == Project.id
+        ).filter(TimelineEntry.user_id == user.id)
+        return paginate_keyset(query, TimelineEntry.created_at, TimelineEntry.project_id, cursor, per_page)
+    
+    materialized = db.select(TimelineEntry.project_id).where(TimelineEntry.user_id == user.id)
+    query = Project.query.options(joinedload(Project.user), selectinload(Project.tag_items)).filter(
+        db.or_(Project.id.in_(materialized), db.and_(Project.user_id.in_(skipped_authors), Project.is_published == True))
+    )
+    return paginate_keyset(query, Project.created_at, Project.id, cursor, per_page)
+
+def _trim(user_ids=None):
+    """Delete entries beyond TIMELINE_MAX_ENTRIES, oldest first, for user_ids (a list or select) or everyone"""
+    ranked = db.select(
+        TimelineEntry.user_id,
+        TimelineEntry.project_id,
+        db.func.row_number().over(
+            partition_by=TimelineEntry.user_id,
+            order_by=(TimelineEntry.created_at.desc(), TimelineEntry.project_id.desc())
+        ).label('position')
+    )
+    if user_ids is not None:
+        ranked = ranked.where(TimelineEntry.user_id.in_(user_ids))
+    ranked = ranked.subquery()
+    overflow = db.select(ranked.c.user_id, ranked.c.project_id).where(
+        ranked.c.position > current_app.config['TIMELINE_MAX_ENTRIES'])
+    return db.session.execute(db.delete(TimelineEntry).where(
+        db.tuple_(TimelineEntry.user_id, TimelineEntry.project_id).in_(overflow)
+    )).rowcount
+
+def trim_timelines():
+    """Cap every timeline at TIMELINE_MAX_ENTRIES; returns how many entries were removed.
+
+    push_project already trims the timelines it writes to, so this is only
+    needed after lowering the cap.
+    """
+    removed = _trim()
+    db.session.commit()
+    return removed
+
+def rebuild_timelines():
+    """Rematerialize every timeline from projects and the follows graph"""
+    db.session.execute(db.delete(TimelineEntry))
+    own = db.select(Project.user_id, Project.id, Project.created_at).where(Project.is_published == True)
+    followed = db.select(follows.c.follower_id, Project.id, Project.created_at).join(
+        Project, Project.user_id == follows.c.followed_id
+    ).join(
+        User, User.id == follows.c.followed_id
+    ).where(
+        Project.is_published == True,
+        User.follower_count <= current_app.config['TIMELINE_FANOUT_LIMIT']
+    )
+    db.session.execute(db.insert(TimelineEntry).from_select(
+        ['user_id', 'project_id', 'created_at'], db.union_all(own, followed)))
+    db.session.commit()
+    return trim_timelines()
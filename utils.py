@@ -1,47 +1,37 @@
 import os
-import secrets
-from PIL import Image
-from flask import current_app
-from models import Notification, db
+from images import upload_root, schedule_variants, variant_path
+from blobstore import store_upload
+from notifier import enqueue
+from fileserver import upload_url
 
-def save_picture(form_picture, folder, size=None):
-    """Save uploaded picture to the uploads folder"""
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    
-    # Create folder if it doesn't exist
-    folder_path = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'], folder)
-    os.makedirs(folder_path, exist_ok=True)
-    
-    picture_path = os.path.join(folder_path, picture_fn)
+def save_picture(form_picture, folder, variants=()):
+    """Save an uploaded file to the content-addressed upload store.
+
+    Identical bytes map to the same file, so a re-upload costs one hash
+    and no disk; only variants that don't exist yet are (re)generated in
+    the background image pool. The caller records the reference with
+    blobstore.replace_reference.
+    """
+    path, _ = store_upload(form_picture, folder)
     
-    if size and f_ext.lower() in ['.jpg', '.jpeg', '.png', '.gif']:
-        # Resize image if size is specified and it's an image
-        img = Image.open(form_picture)
-        img.thumbnail(size, Image.Resampling.LANCZOS)
-        img.save(picture_path)
-    else:
-        # Save original file
-        form_picture.save(picture_path)
+    if variants and os.path.splitext(path)[1] in ['.jpg', '.jpeg', '.png', '.gif']:
+        missing = [variant for variant in variants
+                   if not os.path.exists(os.path.join(upload_root(), variant_path(path, variant)))]
+        if missing:
+            schedule_variants(path, missing)
     
-    return f"{folder}/{picture_fn}"
+    return path
 
 def create_notification(user, notification_type, message, related_user=None, project=None):
-    """Create a new notification for a user"""
-    notification = Notification()
-    notification.user_id = user.id
-    notification.type = notification_type
-    notification.message = message
-    if related_user:
-        notification.related_user_id = related_user.id
-    if project:
-        notification.project_id = project.id
-    db.session.add(notification)
-    db.session.commit()
+    """Queue a new notification for a user; it is written in the background"""
+    enqueue('add', user, notification_type, message, related_user=related_user, project=project)
+
+def retract_notification(user, notification_type, related_user=None, project=None):
+    """Cancel a still-queued notification, e.g. when a like is undone right away"""
+    enqueue('retract', user, notification_type, related_user=related_user, project=project)
 
 def get_file_url(filename):
-    """Get URL for uploaded file"""
+    """Get the content-versioned (cacheable forever) URL for an uploaded file"""
     if filename:
-        return f"/uploads/{filename}"
+        return upload_url(filename)
     return None
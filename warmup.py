@@ -0,0 +1,61 @@
+import logging
+import os
+import time
+from jinja2 import FileSystemBytecodeCache
+
+# Filled in while a worker boots; served by /_debug/metrics
+startup = {'import_seconds': None, 'templates': 0, 'templates_seconds': None,
+           'first_requests': {}, 'ready_seconds': None}
+
+def enable_bytecode_cache(app):
+    """Keep compiled templates on disk, so new workers load them instead of running the Jinja compiler"""
+    directory = app.config['JINJA_CACHE_DIR'] or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+def precompile_templates(app):
+    """Load every template into the environment (and the bytecode cache); returns how many"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+def warm_up(app, import_seconds=None):
+    """Prime a freshly booted worker before it accepts traffic.
+
+    Templates are compiled up front and each WARMUP_PATHS page is
+    requested once in-process, which also builds the URL map and opens
+    the first database connections. Failures are logged, never raised:
+    a cold worker is still better than one that does not start.
+    """
+    started = time.perf_counter()
+    startup['import_seconds'] = import_seconds
+    try:
+        startup['templates'] = precompile_templates(app)
+    except Exception:
+        logging.exception('Template warm-up failed')
+    startup['templates_seconds'] = time.perf_counter() - started
+
+    client = app.test_client()
+    for path in app.config['WARMUP_PATHS']:
+        requested = time.perf_counter()
+        try:
+            status = client.get(path).status_code
+        except Exception:
+            logging.exception('Warm-up request to %s failed', path)
+            continue
+        startup['first_requests'][path] = time.perf_counter() - requested
+        if status >= 500:
+            logging.warning('Warm-up request to %s returned %d', path, status)
+    startup['ready_seconds'] = (import_seconds or 0) + time.perf_counter() - started
+    logging.info('Worker %d ready in %s', os.getpid(), startup_report())
+    return startup
+
+def startup_report():
+    """One line summary of the boot timings"""
+    def ms(seconds):
+        return 'n/a' if seconds is None else f'{seconds * 1000:.0f}ms'
+    requests = ', '.join(f'{path} {ms(seconds)}' for path, seconds in startup['first_requests'].items())
+    return (f'{ms(startup["ready_seconds"])}: imports {ms(startup["import_seconds"])}, '
+            f'{startup["templates"]} templates {ms(startup["templates_seconds"])}, '
+            f'first requests [{requests or "none"}]')